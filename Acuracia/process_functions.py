@@ -1,5 +1,13 @@
 from scipy.signal import butter, filtfilt, find_peaks
+import importlib.util
 import numpy as np
+import os
+
+# process_functions da raiz do repositório (o import normal encontraria este próprio módulo)
+_spec = importlib.util.spec_from_file_location(
+    "process_functions_raiz", os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "process_functions.py"))
+_pf_raiz = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(_pf_raiz)
 
 # Apenas normaliza o sinal usando Z-score
 def filter_z(signal):
@@ -168,44 +176,9 @@ def analyze_signal_spectrum(spectrum, freqs, min_bpm=30, max_bpm=200, num_peaks=
 
     return quality_index
 
-# Função que calcula a frequencia respiratoria
-def calc_frequencia_respiratoria(signal, fs, padding_factor=1):
-    Median_sig = []
-    tamanho_v_deslizante = fs
-    for i in range(int(len(signal) - tamanho_v_deslizante + 1)):
-        v_deslizante = signal[i:int(i+tamanho_v_deslizante)]
-        Median = np.median(v_deslizante)
-        Median_sig.append(Median)
-    Median_sig = np.array(Median_sig)
-
-    # 2: Aplicação da FFT no vetor resultante e seleção do pico de frequência dominante dentro da faixa RR válida - entre 6 rpm (0,1 Hz) e 30 rpm (0.5 Hz)
-    FFT_sig = np.fft.fft(Median_sig, n=len(Median_sig)*padding_factor)
-    f = np.fft.fftfreq(len(FFT_sig), d=1/fs)
-    spectrum = np.abs(FFT_sig)  # Calcular o modulo espectral
-
-    # Encontrar os indices correspondentes as frequencias entre 0.1 e 0.5 bpm
-    indice_inicio = np.argmax(f >= 0.1)
-    indice_fim = np.argmax(f >= 0.5)
-
-    # Encontrar os picos no espectro dentro da faixa desejada
-    peaks, _ = find_peaks(spectrum[indice_inicio:indice_fim])
-    peaks += indice_inicio  # Ajustar os indices dos picos para a faixa total
-
-    # Ordenar os picos pela potencia
-    sorted_peaks = peaks[np.argsort(spectrum[peaks])[::-1]]
-
-    # Selecionar os tres maiores picos
-    if len(sorted_peaks) >= 4:
-        top_peaks = sorted_peaks[:4]
-    else:
-        top_peaks = sorted_peaks
-
-    # Obter as frequencias correspondentes aos maiores picos
-    frequencias_picos = f[top_peaks]
-    if len(frequencias_picos) != 0:
-        fr = frequencias_picos[0]
-    else:
-        fr = 0
-
-    # 3: Multiplicando a frequencia dominante por 60 para converter para "rpm"
-    return fr * 60
\ No newline at end of file
+# Função que calcula a frequencia respiratoria (iRPM) de um sinal ou de uma matriz [n_sinais, n_frames], sem
+# pre-processamento e na faixa de 0.1 a 0.5 Hz. Usa o estimador de ../process_functions.py, carregado pelo
+# caminho porque este módulo tem o mesmo nome. Retorna um float para um sinal e um vetor [n_sinais] para uma matriz.
+def calc_frequencia_respiratoria(signal, fs, f_low=0.1, f_high=0.5, padding_factor=1):
+    return _pf_raiz.calc_frequencia_respiratoria(signal, fs, f_low=f_low, f_high=f_high, pre_processamento=False,
+                                                 padding_factor=padding_factor)
@@ -1,9 +1,12 @@
 import matplotlib.pyplot as plt
-import mediapipe as mp
 import numpy as np
-import math
 import cv2
-import rPPG_Methods as rppg
+import rppg_engine as engine
+import rppg_cache as rc
+import roi_extraction as roi
+import video_pipeline as vp
+import landmark_cache as lc
+import landmark_tracking as lt
 import process_functions as pf
 import os, csv
 
@@ -59,12 +62,15 @@ def csv_generator(bvp_patch, signal_filtered, time_array, spectrum, freqs, metho
 
 # Parâmetros
 patches = [151, 101, 330, 10, 104, 107, 108, 109, 135, 18, 188, 199, 266, 280, 299, 333, 336, 337, 338, 347, 36, 364, 4, 50, 6, 69, 9]  # Regiões de interesse (números de landmarks)
-face_mesh = mp.solutions.face_mesh.FaceMesh(
-    min_detection_confidence=0.5, 
-    min_tracking_confidence=0.5, 
-    max_num_faces=1
-)
+face_mesh_config = {'min_detection_confidence': 0.5, 'min_tracking_confidence': 0.5, 'max_num_faces': 1}
+face_mesh = None  # Criado sob demanda (não é necessário quando os landmarks estão em cache)
 fs = 30  # Frequência de amostragem (Hz)
+threads_metodos = 4  # Threads para os métodos rPPG (1 = sequencial)
+cache_metodos = True  # Reaproveita os BVPs já calculados para a mesma entrada (cache em disco)
+intervalo_keyframe = None  # FaceMesh a cada N frames com rastreamento por fluxo óptico entre eles (None = todos os frames)
+escala_inferencia = 1.0  # Fator de redução do frame na inferência do FaceMesh (as ROIs usam a resolução original)
+preview = False  # Exibe os frames durante a extração (False = modo headless)
+preview_a_cada = 10  # Intervalo, em frames, entre exibições do preview
 
 # Função para plotar os sinais BVP extraídos
 def plot_bvp_signals_separately(bvp_signals, labels, fs):
@@ -90,81 +96,25 @@ def plot_bvp_signals_separately(bvp_signals, labels, fs):
             plt.grid(True)
             plt.show()
 
-def processa_um_frame(frame):
-    """Processa um único frame para extrair as médias RGB dos patches de interesse."""
-    results = face_mesh.process(frame)
-    patch_colors = []
-    
-    if results.multi_face_landmarks:
-        face_landmarks = results.multi_face_landmarks[0]
-        
-        # Converte coordenadas normalizadas para pixels
-        landmarks_points = [
-            (int(landmark.x * frame.shape[1]), int(landmark.y * frame.shape[0]))
-            for landmark in face_landmarks.landmark
-        ]
-        
-        # Calcula o tamanho do patch
-        l = int((math.sqrt((landmarks_points[337][0] - landmarks_points[108][0])**2 +
-                           (landmarks_points[337][1] - landmarks_points[108][1])**2)) / 5)
-        
-        # Extrai os patches para análise
-        for patch in patches:
-            y_min = max(0, landmarks_points[patch][1] - l)
-            y_max = min(frame.shape[0], landmarks_points[patch][1] + l)
-            x_min = max(0, landmarks_points[patch][0] - l)
-            x_max = min(frame.shape[1], landmarks_points[patch][0] + l)
-            
-            if y_max > y_min and x_max > x_min:
-                crop_patch = frame[y_min:y_max, x_min:x_max]
-                mean_red = np.mean(crop_patch[:, :, 0])  # Canal Vermelho
-                mean_green = np.mean(crop_patch[:, :, 1])  # Canal Verde
-                mean_blue = np.mean(crop_patch[:, :, 2])  # Canal Azul
-                patch_colors.append([mean_red, mean_green, mean_blue])
-    
-    # Se não foram encontrados rostos, retorna zeros
-    if not patch_colors:
-        patch_colors = [[0, 0, 0] for _ in patches]
-    
-    return np.array(patch_colors)  # Retorna um array [num_patches, 3]
+def obtem_face_mesh():
+    """Retorna o FaceMesh, criando-o no primeiro uso."""
+    global face_mesh
+    if face_mesh is None:
+        face_mesh = roi.cria_face_mesh(**face_mesh_config)
+    return face_mesh
 
-def processa_um_frame_ssr(frame, patch_id=151, target_size=(32, 32)):
+def detecta_um_frame(frame):
+    """Estágio de landmarks: roda o FaceMesh uma única vez no frame."""
+    return roi.detecta_landmarks(frame, obtem_face_mesh(), escala=escala_inferencia)
+
+def processa_um_frame(frame, landmarks, patch_id=151, target_size=(32, 32)):
     """
-    Processa um único frame para extrair a região de interesse (patch 151) em formato adequado para a função SSR.
-    Sempre retorna um ndarray com shape [target_size[0], target_size[1], 3].
+    Estágio de ROI: a partir dos landmarks já calculados para o frame, extrai as médias RGB
+    dos patches de interesse e o recorte do patch `patch_id` usado pelo SSR.
+    Retorna (array [num_patches, 3], array [target_size[0], target_size[1], 3]).
     """
-    # Processa o frame para obter landmarks
-    results = face_mesh.process(frame)
-    
-    # Inicializa o patch com zeros caso não seja detectado rosto
-    patch_crop = np.zeros((target_size[0], target_size[1], 3), dtype=np.float32)
-    
-    if results.multi_face_landmarks:
-        face_landmarks = results.multi_face_landmarks[0]
-        
-        # Converte coordenadas normalizadas para pixels
-        landmarks_points = [
-            (int(landmark.x * frame.shape[1]), int(landmark.y * frame.shape[0]))
-            for landmark in face_landmarks.landmark
-        ]
-        
-        # Calcula o tamanho do patch (usando distância entre landmarks como referência)
-        l = int((math.sqrt((landmarks_points[337][0] - landmarks_points[108][0]) ** 2 +
-                           (landmarks_points[337][1] - landmarks_points[108][1]) ** 2)) / 5)
-        
-        # Extrai o patch 151 para análise
-        y_min = max(0, landmarks_points[patch_id][1] - l)
-        y_max = min(frame.shape[0], landmarks_points[patch_id][1] + l)
-        x_min = max(0, landmarks_points[patch_id][0] - l)
-        x_max = min(frame.shape[1], landmarks_points[patch_id][0] + l)
-        
-        if y_max > y_min and x_max > x_min:
-            patch_crop_raw = frame[y_min:y_max, x_min:x_max]
-            
-            # Redimensiona para o tamanho fixo `target_size` (independente do tamanho original)
-            patch_crop = cv2.resize(patch_crop_raw, target_size, interpolation=cv2.INTER_AREA)
-    
-    return patch_crop.astype(np.float32)  # Retorna um array [32, 32, 3]
+    return roi.processa_frame(frame, landmarks, patches, divisor=5,
+                              ssr_patch_id=patch_id, ssr_divisor=5, target_size=target_size)
 
 def plot_rppg_signal(rppg_data, fs):
     """
@@ -194,76 +144,74 @@ if __name__ == '__main__':
     # Caminho correto do vídeo
     caminho_video = "video_face_7.h264"
 
-    # Lista para armazenar os valores RGB
-    rppg_channels = []
-    rppg_channels_ssr = []
-
     # Abre o vídeo
     captura = cv2.VideoCapture(caminho_video)
 
     if not captura.isOpened():
         print("Erro ao abrir o vídeo.")
     else:
-        while True:
-            ret, frame = captura.read()
-            if not ret:
-                print("Fim do vídeo ou erro ao ler frame.")
-                break
-            
-            # Processa o frame e armazena o resultado
-            rgb_values = processa_um_frame(frame)  # Agora retorna [num_patches, 3]
-            rppg_channels.append(rgb_values)
-
-            # Processa o frame e extrai o patch 151 com tamanho fixo
-            patch_crop = processa_um_frame_ssr(frame, target_size=(32, 32))
-            rppg_channels_ssr.append(patch_crop)
+        # Acumuladores pré-alocados, já nos formatos usados pelos métodos rPPG:
+        # [num_patches, 3, num_frames] e [num_frames, rows, columns, rgb_channels] (SSR)
+        n_frames_estimado = vp.estima_num_frames(captura)
+        rppg_channels = vp.AcumuladorFrames((len(patches), 3), capacidade=n_frames_estimado)
+        rppg_channels_ssr = vp.AcumuladorFrames((32, 32, 3), capacidade=n_frames_estimado, frames_no_fim=False)
+
+        # Estágio de landmarks: FaceMesh em todos os frames ou só em keyframes, com rastreamento entre eles
+        indices_rastreados = patches + [151, roi.LANDMARK_REF_A, roi.LANDMARK_REF_B]
+        detector, config_landmarks = lt.cria_detector(detecta_um_frame, {**face_mesh_config, 'escala_inferencia': escala_inferencia},
+                                                      indices_rastreados, intervalo_keyframe)
+
+        # Landmarks em cache: o FaceMesh só roda em vídeos (ou parâmetros) ainda não processados
+        cache_landmarks = lc.CacheLandmarks(caminho_video, config_landmarks, detector)
+
+        # Decodificação, landmarks e ROIs rodam em estágios paralelos; os resultados chegam na ordem dos frames
+        for n_frame, frame, (rgb_values, patch_crop) in vp.executa_pipeline(captura, cache_landmarks, processa_um_frame):
+            # Armazena os resultados: [num_patches, 3] e [32, 32, 3]
+            rppg_channels.adiciona(rgb_values)
+            rppg_channels_ssr.adiciona(patch_crop)
             
-            # Exibe o frame
-            cv2.imshow('Frame', frame)
-            if cv2.waitKey(25) & 0xFF == ord('q'):
+            # Exibe o frame (opcional, decimado e não bloqueante)
+            if preview and roi.mostra_preview(frame, n_frame, preview_a_cada):
                 break
+        else:
+            print("Fim do vídeo ou erro ao ler frame.")
+            cache_landmarks.salva()
+            if isinstance(detector, lt.RastreadorLandmarks) and not cache_landmarks.em_cache:
+                print(f"Rastreamento de landmarks: {detector.relatorio()}")
 
     # Libera o objeto de captura e fecha a janela
     captura.release()
-    cv2.destroyAllWindows()
-
-    # Converte a lista para um ndarray com shape [num_patches, 3, num_frames]
-    rppg_channels = np.array(rppg_channels, dtype=np.float32)
-    rppg_channels = rppg_channels.transpose(1, 2, 0)
+    roi.fecha_preview(preview)
 
-    # Converte a lista para um ndarray com o formato necessário [num_frames, rows, columns, rgb_channels]
-    rppg_channels_ssr = np.array(rppg_channels_ssr, dtype=np.float32)
+    # Sinais acumulados: [num_patches, 3, num_frames] e [num_frames, rows, columns, rgb_channels]
+    rppg_channels = rppg_channels.array()
+    rppg_channels_ssr = rppg_channels_ssr.array()
 
     # Mostra o gráfico das capturas no tempo
     #plot_rppg_signal(rppg_channels, fs)
 
-    # Aplicar métodos rPPG
-    bvp_chrom = rppg.CHROM(rppg_channels)
-    bvp_green = rppg.GREEN(rppg_channels)
-    bvp_lgi = rppg.LGI(rppg_channels)
-    bvp_pos = rppg.POS(rppg_channels, fps=fs)
-    bvp_gbgr = rppg.GBGR(rppg_channels)
-    bvp_ica = rppg.ICA(rppg_channels, component='second_comp')
-    bvp_omit = rppg.OMIT(rppg_channels)
-    bvp_pbv = rppg.PBV(rppg_channels)
-    bvp_pca = rppg.PCA(rppg_channels, component='second_comp')
-    bvp_ssr = rppg.SSR(rppg_channels_ssr, fps=fs)
+    # Aplicar métodos rPPG (estatísticas compartilhadas entre os métodos)
+    labels = ['CHROM', 'GREEN', 'LGI', 'POS', 'GBGR', 'ICA', 'OMIT', 'PBV', 'PCA', 'SSR']
+    bvps = engine.executa_metodos(rppg_channels, labels, fps=fs, signal_ssr=rppg_channels_ssr, n_threads=threads_metodos,
+                                  cache=rc.CacheBVP() if cache_metodos else None)
 
     # Lista de sinais e seus rótulos
-    bvp_signals = [bvp_chrom, bvp_green, bvp_lgi, bvp_pos, bvp_gbgr, bvp_ica, bvp_omit, bvp_pbv, bvp_pca, bvp_ssr]
-    labels = ['CHROM', 'GREEN', 'LGI', 'POS', 'GBGR', 'ICA', 'OMIT', 'PBV', 'PCA', 'SSR']
+    bvp_signals = [bvps[label] for label in labels]
 
     # Analisa cada um do métodos
     for j, bvp_patches in enumerate(bvp_signals):
         print(f'Shape: {bvp_patches.shape}')
 
+        # Aplicar o filtro Butterworth e calcular o espectro (de 0 BPM até a faixa de busca do BPM) em todos os patches de uma vez.
+        # A grade começa em 0 BPM porque os leitores em Acuracia descartam as primeiras linhas pelo deslocamento de sincronismo
+        signals_filtered = pf.filter_z_butterworth(bvp_patches, fs)
+        spectra, freqs = pf.calculate_zoom_fft(signals_filtered, fs, min_freq=0)
+
         # Para cada método, analisa cada um dos patches
         for i, bvp_patch in enumerate(bvp_patches):
-
-            # Aplicar o filtro Butterworth
-            signal_filtered = pf.filter_z_butterworth(bvp_patch, fs)
+            signal_filtered = signals_filtered[i]
+            spectrum = spectra[i]
             time_array = np.linspace(0, len(signal_filtered) / fs, len(signal_filtered))
-            spectrum, freqs = pf.calculate_fft(signal_filtered, fs)
 
             # Gera 3 arquivos csv, uma para o sinal bruto, outro para o filtrado e outro para a análise espectral
             csv_generator(bvp_patch, signal_filtered, time_array, spectrum, freqs, labels[j], patches[i])
\ No newline at end of file
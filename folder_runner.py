@@ -0,0 +1,59 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import multiprocessing
+import os
+
+"""
+Processamento paralelo de uma pasta de vídeos.
+
+Cada vídeo é enviado a um processo de um pool. Os processos são criados com 'spawn',
+de modo que cada worker importa o script do zero e cria o seu próprio FaceMesh
+(nenhum estado do mediapipe é herdado do processo principal). Um erro em um vídeo
+é registrado e não interrompe os demais.
+"""
+
+def lista_videos(video_folder, extensoes=('.mp4', '.avi', '.h264')):
+    """Retorna a lista ordenada dos arquivos de vídeo da pasta."""
+    return sorted(f for f in os.listdir(video_folder) if f.endswith(extensoes))
+
+def processa_pasta(video_folder, process_video, n_workers=None, extensoes=('.mp4', '.avi', '.h264')):
+    """
+    Processa todos os vídeos de uma pasta em paralelo.
+
+    Parâmetros:
+    - video_folder: Pasta com os vídeos.
+    - process_video: Função de nível de módulo `process_video(video_path, video_file)` executada em cada worker.
+    - n_workers: Número de processos (None = número de núcleos da máquina).
+    - extensoes: Extensões de arquivo consideradas como vídeo.
+
+    Retorna um dicionário {video_file: exceção} com os vídeos que falharam.
+    """
+    video_files = lista_videos(video_folder, extensoes)
+    total = len(video_files)
+    falhas = {}
+
+    if n_workers is None:
+        n_workers = os.cpu_count() or 1
+    n_workers = max(1, min(n_workers, total))
+
+    print(f"Processando {total} vídeos de {video_folder} com {n_workers} processos")
+
+    contexto = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=n_workers, mp_context=contexto) as executor:
+        futuros = {
+            executor.submit(process_video, os.path.join(video_folder, video_file), video_file): video_file
+            for video_file in video_files
+        }
+
+        for concluidos, futuro in enumerate(as_completed(futuros), start=1):
+            video_file = futuros[futuro]
+            try:
+                futuro.result()
+                print(f"[{concluidos}/{total}] Vídeo concluído: {video_file}")
+            except Exception as erro:
+                falhas[video_file] = erro
+                print(f"[{concluidos}/{total}] Erro ao processar o vídeo {video_file}: {erro!r}")
+
+    if falhas:
+        print(f"{len(falhas)} de {total} vídeos falharam: {', '.join(sorted(falhas))}")
+
+    return falhas
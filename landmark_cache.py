@@ -0,0 +1,97 @@
+import mediapipe as mp
+import numpy as np
+import hashlib
+import json
+import os
+
+"""
+Cache persistente das trajetórias de landmarks de cada vídeo.
+
+Os landmarks normalizados de todos os frames são salvos uma única vez por vídeo em um
+arquivo .npy [num_frames, num_landmarks, 2] (NaN nos frames sem rosto). A chave do cache
+é um hash do conteúdo do vídeo junto com os parâmetros do FaceMesh, então mudar a lista de
+patches, o divisor do tamanho dos patches ou o `target_size` do SSR reaproveita o cache,
+e a extração passa a custar apenas a decodificação e os recortes.
+"""
+
+PASTA_CACHE = os.path.join("cache", "landmarks")
+VERSAO_CACHE = 1  # Incrementar se o formato dos arquivos mudar
+
+def hash_video(video_path, tamanho_bloco=1 << 20):
+    """Calcula o hash SHA-1 do conteúdo do arquivo de vídeo."""
+    h = hashlib.sha1()
+    with open(video_path, 'rb') as arquivo:
+        for bloco in iter(lambda: arquivo.read(tamanho_bloco), b''):
+            h.update(bloco)
+    return h.hexdigest()
+
+def chave_cache(video_path, face_mesh_config):
+    """Gera a chave do cache a partir do conteúdo do vídeo e dos parâmetros do FaceMesh."""
+    descricao = {
+        'video': hash_video(video_path),
+        'face_mesh': face_mesh_config,
+        'mediapipe': getattr(mp, '__version__', ''),
+        'versao': VERSAO_CACHE,
+    }
+    return hashlib.sha1(json.dumps(descricao, sort_keys=True).encode('utf-8')).hexdigest()
+
+class CacheLandmarks:
+    """
+    Cache dos landmarks de um vídeo, usado no lugar da função de detecção do pipeline.
+
+    A instância é chamável: `cache(frame)` devolve os landmarks do próximo frame, lidos do
+    cache quando existirem ou calculados com `detecta(frame)` e guardados para serem salvos
+    com `salva()`. Os frames devem chegar em ordem e por uma única thread, como no estágio
+    de landmarks de video_pipeline.executa_pipeline.
+
+    Parâmetros:
+    - video_path: Caminho do vídeo.
+    - face_mesh_config: Dicionário com os parâmetros do FaceMesh (faz parte da chave).
+    - detecta: Função `detecta(frame) -> landmarks` usada quando o frame não está no cache.
+    - pasta: Pasta onde os arquivos do cache são salvos.
+    - dtype: Tipo usado para salvar os landmarks (np.float32 ou np.float16).
+    """
+    def __init__(self, video_path, face_mesh_config, detecta, pasta=PASTA_CACHE, dtype=np.float32):
+        self.detecta = detecta
+        self.dtype = dtype
+        self.caminho = os.path.join(pasta, f"{chave_cache(video_path, face_mesh_config)}.npy")
+        self.landmarks = np.load(self.caminho) if os.path.exists(self.caminho) else None
+        self.novos = []
+        self.n_frame = 0
+
+    @property
+    def em_cache(self):
+        """True se os landmarks do vídeo foram carregados do cache."""
+        return self.landmarks is not None
+
+    def __call__(self, frame):
+        n_frame = self.n_frame
+        self.n_frame += 1
+
+        if self.em_cache and n_frame < len(self.landmarks):
+            landmarks = self.landmarks[n_frame]
+            return None if np.isnan(landmarks[0, 0]) else landmarks.astype(np.float64)
+
+        landmarks = self.detecta(frame)
+        self.novos.append(landmarks)
+        return landmarks
+
+    def salva(self):
+        """Salva os landmarks calculados (chamar somente se o vídeo foi processado até o fim)."""
+        if self.em_cache or not self.novos:
+            return
+
+        detectados = [landmarks for landmarks in self.novos if landmarks is not None]
+        num_landmarks = len(detectados[0]) if detectados else 468
+
+        trajetorias = np.full((len(self.novos), num_landmarks, 2), np.nan, dtype=self.dtype)
+        for n_frame, landmarks in enumerate(self.novos):
+            if landmarks is not None:
+                trajetorias[n_frame] = landmarks
+
+        # Escreve em um arquivo temporário e renomeia, para não deixar arquivos incompletos
+        os.makedirs(os.path.dirname(self.caminho), exist_ok=True)
+        temporario = f"{self.caminho}.{os.getpid()}.tmp"
+        with open(temporario, 'wb') as arquivo:
+            np.save(arquivo, trajetorias)
+        os.replace(temporario, self.caminho)
@@ -0,0 +1,144 @@
+import numpy as np
+import cv2
+
+"""
+Detecção de landmarks em keyframes com rastreamento por fluxo óptico entre eles.
+
+O FaceMesh roda apenas a cada `intervalo_keyframe` frames (ou quando o rastreamento perde
+confiança). Nos frames intermediários os centros dos patches são propagados com o fluxo
+óptico esparso de Lucas-Kanade; os demais landmarks acompanham o deslocamento mediano.
+"""
+
+class RastreadorLandmarks:
+    """
+    Substitui a função de detecção do pipeline: `rastreador(frame)` devolve os landmarks
+    normalizados [num_landmarks, 2] (ou None), com a mesma interface de roi.detecta_landmarks.
+    Os frames devem chegar em ordem e por uma única thread (estágio de landmarks do pipeline).
+
+    Parâmetros:
+    - detecta: Função `detecta(frame) -> landmarks` que executa o FaceMesh.
+    - indices: Landmarks rastreados com fluxo óptico (centros dos patches e landmarks de referência).
+    - intervalo_keyframe: Número de frames entre duas inferências completas do FaceMesh.
+    - limiar_deriva: Erro máximo (pixels) do teste ida-e-volta do fluxo óptico para um ponto ser válido.
+    - min_pontos_validos: Fração mínima de pontos válidos; abaixo dela um keyframe é forçado.
+    - win_size, max_level: Parâmetros do cv2.calcOpticalFlowPyrLK.
+    """
+    def __init__(self, detecta, indices, intervalo_keyframe=10, limiar_deriva=1.0, min_pontos_validos=0.8,
+                 win_size=(21, 21), max_level=3):
+        self.detecta = detecta
+        self.indices = np.unique(np.asarray(indices))
+        self.intervalo_keyframe = intervalo_keyframe
+        self.limiar_deriva = limiar_deriva
+        self.min_pontos_validos = min_pontos_validos
+        self.parametros_lk = {
+            'winSize': tuple(win_size),
+            'maxLevel': max_level,
+            'criteria': (cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, 30, 0.01),
+        }
+
+        self.landmarks_px = None  # Estimativa atual dos landmarks em pixels (float)
+        self.cinza_anterior = None
+        self.frames_desde_keyframe = 0
+
+        # Estatísticas
+        self.n_frames = 0
+        self.n_keyframes = 0
+        self.n_keyframes_forcados = 0
+        self.derivas = []  # Distância mediana (pixels) entre os pontos rastreados e os detectados em cada keyframe
+
+    @property
+    def config(self):
+        """Parâmetros do rastreamento (entram na chave do cache de landmarks)."""
+        return {
+            'rastreamento': {
+                'indices': self.indices.tolist(),
+                'intervalo_keyframe': self.intervalo_keyframe,
+                'limiar_deriva': self.limiar_deriva,
+                'min_pontos_validos': self.min_pontos_validos,
+                'win_size': list(self.parametros_lk['winSize']),
+                'max_level': self.parametros_lk['maxLevel'],
+            }
+        }
+
+    def _rastreia(self, cinza):
+        """Propaga os landmarks do frame anterior; retorna a nova estimativa ou None se perder a confiança."""
+        p0 = self.landmarks_px[self.indices].astype(np.float32).reshape(-1, 1, 2)
+        p1, status, _ = cv2.calcOpticalFlowPyrLK(self.cinza_anterior, cinza, p0, None, **self.parametros_lk)
+        p0_volta, status_volta, _ = cv2.calcOpticalFlowPyrLK(cinza, self.cinza_anterior, p1, None, **self.parametros_lk)
+
+        # Teste ida-e-volta: o ponto rastreado deve voltar para a posição de origem
+        erro_ida_volta = np.linalg.norm(p0 - p0_volta, axis=2).ravel()
+        validos = (status.ravel() == 1) & (status_volta.ravel() == 1) & (erro_ida_volta < self.limiar_deriva)
+        if validos.mean() < self.min_pontos_validos:
+            return None
+
+        deslocamentos = (p1 - p0).reshape(-1, 2).astype(np.float64)
+        deslocamento_mediano = np.median(deslocamentos[validos], axis=0)
+
+        landmarks_px = self.landmarks_px + deslocamento_mediano
+        landmarks_px[self.indices] = self.landmarks_px[self.indices] + np.where(
+            validos[:, None], deslocamentos, deslocamento_mediano)
+        return landmarks_px
+
+    def _keyframe(self, frame, escala, estimativa=None, forcado=False):
+        """Executa o FaceMesh e, se houver estimativa rastreada, mede a deriva acumulada."""
+        landmarks = self.detecta(frame)
+        self.n_keyframes += 1
+        self.n_keyframes_forcados += int(forcado)
+        self.frames_desde_keyframe = 0
+
+        if landmarks is None:
+            self.landmarks_px = None
+            return None
+
+        self.landmarks_px = landmarks * escala
+        if estimativa is not None:
+            distancias = np.linalg.norm(estimativa[self.indices] - self.landmarks_px[self.indices], axis=1)
+            self.derivas.append(float(np.median(distancias)))
+        return landmarks
+
+    def __call__(self, frame):
+        cinza = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        escala = np.array([frame.shape[1], frame.shape[0]], dtype=np.float64)
+        self.n_frames += 1
+
+        if self.landmarks_px is None:
+            # Sem rosto rastreado: tenta detectar em todo frame
+            landmarks = self._keyframe(frame, escala)
+        else:
+            estimativa = self._rastreia(cinza)
+            if estimativa is None:
+                landmarks = self._keyframe(frame, escala, forcado=True)
+            elif self.frames_desde_keyframe + 1 >= self.intervalo_keyframe:
+                landmarks = self._keyframe(frame, escala, estimativa=estimativa)
+            else:
+                self.landmarks_px = estimativa
+                self.frames_desde_keyframe += 1
+                landmarks = estimativa / escala
+
+        self.cinza_anterior = cinza
+        return landmarks
+
+    def relatorio(self):
+        """Resumo do rastreamento: keyframes executados e deriva medida nos keyframes (pixels)."""
+        return {
+            'frames': self.n_frames,
+            'keyframes': self.n_keyframes,
+            'keyframes_forcados': self.n_keyframes_forcados,
+            'deriva_mediana': float(np.median(self.derivas)) if self.derivas else 0.0,
+            'deriva_maxima': float(np.max(self.derivas)) if self.derivas else 0.0,
+        }
+
+def cria_detector(detecta, face_mesh_config, indices, intervalo_keyframe=None, **kargs):
+    """
+    Monta o estágio de landmarks do pipeline.
+
+    Com `intervalo_keyframe` None (ou 1) o FaceMesh roda em todos os frames; caso contrário é
+    usado um RastreadorLandmarks. Retorna (detector, config), onde `config` é o dicionário usado
+    como chave do cache de landmarks (parâmetros do FaceMesh e, se houver, do rastreamento).
+    """
+    if not intervalo_keyframe or intervalo_keyframe <= 1:
+        return detecta, face_mesh_config
+
+    rastreador = RastreadorLandmarks(detecta, indices, intervalo_keyframe=intervalo_keyframe, **kargs)
+    return rastreador, {**face_mesh_config, **rastreador.config}
@@ -0,0 +1,260 @@
+from concurrent.futures import ThreadPoolExecutor
+from collections import deque
+import numpy as np
+import time
+import cv2
+import rPPG_Methods as rppg
+import rppg_streaming as rs
+import roi_extraction as roi
+import process_functions as pf
+
+"""
+Estimativa de BPM e iRPM em tempo real a partir de uma câmera.
+
+Os frames são lidos de cv2.VideoCapture(indice) e as médias RGB dos patches entram em uma
+janela deslizante de tamanho fixo. A cada `hop` segundos a janela é copiada e a estimativa
+(método rPPG + filtro + espectro na faixa do BPM) roda em uma thread separada, sem bloquear a
+captura. Se a estimativa anterior ainda não terminou, o hop é descartado em vez de enfileirado,
+então a latência fica limitada e o custo de cada hop depende só do tamanho da janela, não do
+tempo decorrido.
+
+Cada amostra guarda o instante (time.monotonic()) em que o frame foi lido. Com o buffer mínimo
+do driver, os frames que chegam enquanto o anterior ainda está sendo processado são perdidos, e
+muitas câmeras informam um FPS que não entregam; por isso a taxa real é menor que a nominal. Antes
+da estimativa, cada janela é reamostrada em uma grade uniforme com a taxa efetiva (medida pelos
+instantes da própria janela), que é a taxa usada no filtro e nos espectros. A taxa efetiva e o
+número estimado de frames perdidos na janela são publicados junto com BPM e iRPM.
+
+Para os métodos cuja versão incremental (rppg_streaming) equivale ao método em lote
+(rs.EQUIVALENTES_AO_LOTE) o BVP é calculado frame a frame, em O(1) por frame, e a janela
+deslizante guarda diretamente o BVP; a estimativa então só filtra e analisa o espectro. O POS
+incremental emite as amostras com atraso de 1,6 s. O CHROM continua em lote: no incremental o
+alpha muda de amostra para amostra e a forma de onda da janela difere da do CHROM em lote.
+"""
+
+# Parâmetros
+patches = [151, 101, 330, 10, 104, 107, 108, 109, 135, 18, 188, 199, 266, 280, 299, 333, 336, 337, 338, 347, 36, 364, 4, 50, 6, 69, 9]  # Regiões de interesse (números de landmarks)
+face_mesh_config = {'min_detection_confidence': 0.5, 'min_tracking_confidence': 0.5, 'max_num_faces': 1}
+camera = 0  # Índice da câmera
+metodo = 'POS'  # Método rPPG usado na estimativa
+janela_bpm = 10  # Duração (s) da janela usada para o BPM
+janela_irpm = 30  # Duração (s) da janela usada para o iRPM
+hop = 1.0  # Intervalo (s) entre duas estimativas
+incremental = True  # Usa a versão incremental do método, quando ela equivale ao método em lote
+preview = False  # Exibe os frames da câmera
+preview_a_cada = 5  # Intervalo, em frames, entre exibições do preview
+
+# Métodos rPPG que trabalham com as médias RGB dos patches ([num_patches, 3, num_frames])
+METODOS = {
+    'CHROM': lambda sinal, fs: rppg.CHROM(sinal),
+    'GREEN': lambda sinal, fs: rppg.GREEN(sinal),
+    'LGI': lambda sinal, fs: rppg.LGI(sinal),
+    'POS': lambda sinal, fs: rppg.POS(sinal, fps=fs),
+    'GBGR': lambda sinal, fs: rppg.GBGR(sinal),
+    'ICA': lambda sinal, fs: rppg.ICA(sinal, component='second_comp'),
+    'OMIT': lambda sinal, fs: rppg.OMIT(sinal),
+    'PBV': lambda sinal, fs: rppg.PBV(sinal),
+    'PCA': lambda sinal, fs: rppg.PCA(sinal, component='second_comp'),
+}
+
+class JanelaDeslizante:
+    """
+    Buffer circular com as últimas `tamanho` amostras, cada uma com formato `forma_amostra`
+    (ex.: (num_patches, 3) para as médias RGB ou (num_patches,) para o BVP).
+
+    Cada amostra é escrita em duas posições de um array com o dobro do tamanho, de modo que a
+    janela ordenada é sempre uma fatia contígua (view), obtida em O(1).
+    """
+    def __init__(self, forma_amostra, tamanho, dtype=np.float32):
+        self.tamanho = tamanho
+        self.dados = np.zeros(tuple(forma_amostra) + (2 * tamanho,), dtype=dtype)
+        self.posicao = 0
+        self.n_amostras = 0
+
+    def adiciona(self, valores):
+        self.dados[..., self.posicao] = valores
+        self.dados[..., self.posicao + self.tamanho] = valores
+        self.posicao = (self.posicao + 1) % self.tamanho
+        self.n_amostras += 1
+
+    def ultimas(self, n):
+        """Retorna as últimas `n` amostras em ordem temporal: array [*forma_amostra, n]."""
+        fim = self.posicao + self.tamanho
+        return self.dados[..., fim - n:fim]
+
+def reamostra(janela, tempos):
+    """
+    Reamostra uma janela [..., n] cujas amostras foram lidas nos instantes `tempos` (s) em uma grade
+    uniforme com o mesmo número de amostras. Retorna a janela reamostrada e a taxa efetiva (Hz).
+    """
+    n = janela.shape[-1]
+    duracao = tempos[-1] - tempos[0]
+    if n < 2 or duracao <= 0:
+        return janela, None
+    grade = np.linspace(tempos[0], tempos[-1], n)
+    linhas = janela.reshape(-1, n)
+    uniforme = np.stack([np.interp(grade, tempos, linha) for linha in linhas]).reshape(janela.shape)
+    return uniforme.astype(janela.dtype, copy=False), (n - 1) / duracao
+
+def frames_perdidos(tempos, fs):
+    """Estima quantos frames faltam entre os instantes `tempos` (s) de uma câmera com taxa nominal `fs`."""
+    intervalos = np.round(np.diff(tempos) * fs)
+    return int(np.sum(np.maximum(intervalos - 1, 0)))
+
+def estima_bpm(bvp, fs):
+    """Estima o BPM de uma janela de BVPs [num_patches, num_frames]: mediana das estimativas dos patches."""
+    bpms = []
+    spectra, freqs = pf.calculate_zoom_fft(pf.filter_z_butterworth(bvp, fs), fs)
+    for spectrum in spectra:
+        bpm = pf.calc_frequencia_cardiaca(spectrum, freqs)
+        if bpm is not None:
+            bpms.append(bpm)
+    return float(np.median(bpms)) if bpms else None
+
+def estima_irpm(bvp, fs):
+    """Estima o iRPM de uma janela de BVPs [num_patches, num_frames] a partir da média dos BVPs normalizados."""
+    bvp_medio = np.mean(pf.filter_z(bvp), axis=0)
+    return float(pf.calc_frequencia_respiratoria(bvp_medio, int(round(fs))))
+
+class MonitorFrequencias:
+    """
+    Mantém a janela deslizante das médias RGB e publica BPM e iRPM a cada hop.
+
+    Parâmetros:
+    - num_patches: Número de patches por frame.
+    - fs: Taxa de quadros nominal da câmera (Hz), usada no tamanho das janelas.
+    - metodo: Nome do método rPPG (chave de METODOS).
+    - janela_bpm, janela_irpm: Duração (s) das janelas usadas em cada estimativa.
+    - hop: Intervalo (s) entre estimativas.
+    - publica: Função chamada com o dicionário de cada estimativa.
+    - incremental: Se True e o método estiver em rs.EQUIVALENTES_AO_LOTE, o BVP é calculado frame a frame.
+    """
+    def __init__(self, num_patches, fs, metodo='POS', janela_bpm=10, janela_irpm=30, hop=1.0, publica=print,
+                 incremental=True):
+        self.fs = fs
+        self.metodo = metodo
+        self.n_bpm = int(janela_bpm * fs)
+        self.n_irpm = int(janela_irpm * fs)
+        self.n_hop = max(1, int(hop * fs))
+        self.publica = publica
+        self.incremental = None
+        if incremental and metodo in rs.EQUIVALENTES_AO_LOTE:
+            self.incremental = rs.cria_metodo(metodo, fs, janela=self.n_bpm)
+        # Com o método incremental a janela guarda o BVP; senão, as médias RGB
+        forma_amostra = (num_patches,) if self.incremental is not None else (num_patches, 3)
+        self.janela = JanelaDeslizante(forma_amostra, max(self.n_bpm, self.n_irpm))
+        # Instantes (s) de cada amostra da janela e, no modo incremental, dos frames cujo BVP ainda não saiu
+        self.tempos = JanelaDeslizante((), max(self.n_bpm, self.n_irpm), dtype=np.float64)
+        self.tempos_pendentes = deque()
+        self.n_frames = 0
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.futuro = None
+        self.hops_descartados = 0
+
+    def adiciona(self, valores, instante=None):
+        """
+        Adiciona as médias RGB de um frame lido em `instante` (s, time.monotonic() se omitido) e
+        dispara a estimativa quando um hop se completa.
+        """
+        instante = time.monotonic() if instante is None else instante
+        self.n_frames += 1
+        if self.incremental is not None:
+            self.tempos_pendentes.append(instante)
+            for amostra in self.incremental.adiciona(valores[:, :, None]).T:
+                self.janela.adiciona(amostra)
+                self.tempos.adiciona(self.tempos_pendentes.popleft())
+        else:
+            self.janela.adiciona(valores)
+            self.tempos.adiciona(instante)
+
+        n = self.janela.n_amostras
+        if n < self.n_bpm or self.n_frames % self.n_hop != 0:
+            return
+
+        if self.futuro is not None and not self.futuro.done():
+            self.hops_descartados += 1
+            return
+
+        # Cópia da janela: o buffer continua sendo escrito enquanto a estimativa roda
+        janela_bpm = (self.janela.ultimas(self.n_bpm).copy(), self.tempos.ultimas(self.n_bpm).copy())
+        janela_irpm = None
+        if n >= self.n_irpm:
+            janela_irpm = (self.janela.ultimas(self.n_irpm).copy(), self.tempos.ultimas(self.n_irpm).copy())
+        self.futuro = self.executor.submit(self._estima, janela_bpm, janela_irpm, time.time())
+
+    def _bvp(self, janela, tempos):
+        """
+        BVP de uma janela reamostrada na taxa efetiva: já é o próprio BVP no modo incremental; senão
+        aplica o método às médias RGB. Retorna o BVP e a taxa efetiva.
+        """
+        janela, fs = reamostra(janela, tempos)
+        fs = fs or self.fs
+        bvp = janela if self.incremental is not None else METODOS[self.metodo](janela, fs)
+        return bvp, fs
+
+    def _estima(self, janela_bpm, janela_irpm, instante):
+        try:
+            bvp, fs = self._bvp(*janela_bpm)
+            resultado = {
+                'tempo': instante,
+                'bpm': estima_bpm(bvp, fs),
+                'irpm': estima_irpm(*self._bvp(*janela_irpm)) if janela_irpm is not None else None,
+                'fs': fs,
+                'frames_perdidos': frames_perdidos(janela_bpm[1], self.fs),
+                'latencia': time.time() - instante,
+            }
+            self.publica(resultado)
+        except Exception as erro:
+            print(f"Erro na estimativa: {erro!r}")
+
+    def encerra(self):
+        self.executor.shutdown(wait=True)
+
+def monitora_camera(indice=0, patches=patches, metodo='POS', janela_bpm=10, janela_irpm=30, hop=1.0,
+                    preview=False, preview_a_cada=5, publica=print, incremental=True):
+    """Lê a câmera `indice` e publica as estimativas até o fim da captura (ou 'q' no preview)."""
+    captura = cv2.VideoCapture(indice)
+    if not captura.isOpened():
+        print(f"Erro ao abrir a câmera: {indice}")
+        return
+
+    # Buffer mínimo no driver, para processar sempre o frame mais recente. Os frames perdidos
+    # enquanto um frame é processado são compensados pelos instantes de cada amostra
+    captura.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+    fs = captura.get(cv2.CAP_PROP_FPS) or 30.0  # Taxa nominal, usada só no tamanho das janelas
+
+    face_mesh = roi.cria_face_mesh(**face_mesh_config)
+    monitor = MonitorFrequencias(len(patches), fs, metodo, janela_bpm, janela_irpm, hop, publica, incremental)
+    ultimo_valor = None
+    n_frame = 0
+
+    try:
+        while True:
+            ret, frame = captura.read()
+            instante = time.monotonic()
+            if not ret:
+                print("Fim da captura ou erro ao ler frame.")
+                break
+
+            landmarks = roi.detecta_landmarks(frame, face_mesh)
+            if landmarks is not None:
+                pontos = roi.landmarks_em_pixels(landmarks, frame.shape)
+                ultimo_valor = roi.extrai_medias_patches(frame, pontos, patches, roi.tamanho_patch(pontos, 4))
+
+            # Sem rosto no frame: repete a última amostra válida para manter a base de tempo
+            if ultimo_valor is not None:
+                monitor.adiciona(ultimo_valor, instante)
+
+            if preview and roi.mostra_preview(frame, n_frame, preview_a_cada):
+                break
+            n_frame += 1
+    finally:
+        captura.release()
+        roi.fecha_preview(preview)
+        monitor.encerra()
+
+    if monitor.hops_descartados:
+        print(f"{monitor.hops_descartados} estimativas descartadas (estimativa anterior ainda em execução)")
+
+if __name__ == '__main__':
+    monitora_camera(camera, patches, metodo, janela_bpm, janela_irpm, hop, preview, preview_a_cada, incremental=incremental)
@@ -1,35 +1,42 @@
-from scipy.signal import butter, filtfilt, find_peaks
+from scipy.signal import butter, sosfiltfilt, find_peaks, ZoomFFT
+from scipy.linalg import solveh_banded
+from functools import lru_cache
 import numpy as np
+import math
 
-# Apenas normaliza o sinal usando Z-score
+# Apenas normaliza o sinal usando Z-score (ao longo do último eixo: aceita um sinal ou uma matriz [n_sinais, n_frames])
 def filter_z(signal):
     # Z-Score Normalizacao 
-    x = np.mean(signal)
-    dp = np.std(signal)
+    x = np.mean(signal, axis=-1, keepdims=True)
+    dp = np.std(signal, axis=-1, keepdims=True)
     norm_signal = (signal - x) / dp
 
     return norm_signal
 
-# Apenas filtro de butterworth
-def filter_butterworth(signal, fs, order=6):
-    # Aplica o filtro de passa banda
+# Projeto do filtro de Butterworth passa-faixa em seções de segunda ordem (SOS), em cache por (fs, banda, ordem).
+# Em SOS o filtro de ordem 6 continua estável em fs=60, onde os coeficientes (b, a) perdem precisão.
+@lru_cache(maxsize=None)
+def sos_butterworth(fs, f_low, f_high, order):
     nyquist = 0.5 * fs
-    f_low = 0.6
-    f_high = 3.6
 
     # Calcular as frequências normalizadas
-    wn_low =  f_low / nyquist
+    wn_low = f_low / nyquist
     wn_high = f_high / nyquist
 
-    # Calcular os coeficientes do filtro Butterworth
-    b, a = butter(order, [wn_low, wn_high], btype='band')
+    return butter(order, [wn_low, wn_high], btype='band', output='sos')
+
+# Apenas filtro de butterworth (ao longo do último eixo: aceita um sinal ou uma matriz [n_sinais, n_frames])
+def filter_butterworth(signal, fs, order=6):
+    # Aplica o filtro de passa banda
+    f_low = 0.6
+    f_high = 3.6
 
-    # Aplicar o filtro passa-faixa
-    y = filtfilt(b, a, signal)
+    # Aplicar o filtro passa-faixa, com fase zero, em todos os sinais de uma vez
+    y = sosfiltfilt(sos_butterworth(fs, f_low, f_high, order), signal, axis=-1)
 
     return y
 
-# Normaliza Z-Score e aplica o filtro de ButterWorth
+# Normaliza Z-Score e aplica o filtro de ButterWorth (um sinal ou uma matriz [n_sinais, n_frames])
 def filter_z_butterworth(signal, fs):
     
     y = filter_butterworth(filter_z(signal), fs)
@@ -38,36 +45,60 @@ def filter_z_butterworth(signal, fs):
 
 # Alinha a onda no eixo x e aplica o filtro de Butterworth
 def filter_align_butterworth(signal, fs):
-    x = np.mean(signal)
+    x = np.mean(signal, axis=-1, keepdims=True)
     signal = (signal - x)
 
     y = filter_butterworth(signal, fs)
 
     return y
 
-# Função que aprimora os picos do sinal
+# Função que aprimora os picos do sinal (ao longo do último eixo: aceita um sinal ou uma matriz [n_sinais, n_frames])
 def peak_enhancement(sig):
     rb = 1024 # rb é o intervalo do limite superior
     l_lt = 0 # l_lt o intervalo dos limites inferiores
-    P_aprimorado = rb*((sig-min(sig))/(max(sig) - min(sig))) + l_lt
+    minimo = np.min(sig, axis=-1, keepdims=True)
+    maximo = np.max(sig, axis=-1, keepdims=True)
+    P_aprimorado = rb*((sig-minimo)/(maximo - minimo)) + l_lt
 
     return P_aprimorado
 
-# Função que aplica o filtro de hampel para remoção de pontos fora da curva
-def hampel_filter(sig, window_size=6, n_sigma=3):
-    hampel_filter_sig = sig.copy()
-    for i in range(len(sig) - window_size + 1):
-        window = sig[i:i + window_size]
-        mediana = np.median(window)
-        mad = np.median(np.abs(window - mediana))
+# Função que aplica o filtro de hampel para remoção de pontos fora da curva (ao longo do último eixo: aceita um sinal
+# ou uma matriz [n_sinais, n_frames]). Para cada janela i (de tamanho window_size) os pontos acima de
+# mediana_i + n_sigma * MAD_i recebem mediana_i; se um ponto é marcado por várias janelas, vale a última delas.
+def hampel_filter(sig, window_size=6, n_sigma=3, elementos_por_bloco=1 << 22):
+    sig = np.asarray(sig)
+    n = sig.shape[-1]
+    n_janelas = n - window_size + 1
+    if n_janelas <= 0:
+        return sig.copy()
+
+    # Sinais processados em blocos, para limitar a memória das janelas [n_sinais, n_janelas, window_size]
+    linhas = sig.reshape(-1, n)
+    saida = np.empty_like(linhas)
+    por_bloco = max(1, elementos_por_bloco // (n_janelas * window_size))
+    inicios = np.arange(n_janelas)
+    for b in range(0, len(linhas), por_bloco):
+        bloco = linhas[b:b + por_bloco]
+        janelas = np.lib.stride_tricks.sliding_window_view(bloco, window_size, axis=-1)  # [n_sinais, n_janelas, window_size]
+        mediana = np.median(janelas, axis=-1)
+        mad = np.median(np.abs(janelas - mediana[..., None]), axis=-1)
         threshold = mediana + (n_sigma * mad)
-        for j in range(i, i + window_size):
-            if sig[j] > threshold:
-                hampel_filter_sig[j] = mediana
+        acima = janelas > threshold[..., None]
+
+        # Última janela que marca cada ponto j (-1 se nenhuma): a janela i cobre os pontos i .. i + window_size - 1
+        ultima = np.full(bloco.shape, -1)
+        for k in range(window_size):
+            trecho = ultima[:, k:k + n_janelas]
+            np.maximum(trecho, np.where(acima[:, :, k], inicios, -1), out=trecho)
+
+        substituto = np.take_along_axis(mediana, np.maximum(ultima, 0), axis=-1)
+        saida[b:b + por_bloco] = np.where(ultima >= 0, substituto, bloco)
 
-    return hampel_filter_sig
+    return saida.reshape(sig.shape)
 
-# Passa alta detrending
+# Passa alta detrending (smoothness priors), ao longo do último eixo: aceita um sinal ou uma matriz [n_sinais, n_frames].
+# A = I + lambda^2 * D^T * D é pentadiagonal e simétrica positiva definida, então o sistema é resolvido com a
+# decomposição de Cholesky em banda: memória e tempo O(n), sem montar matrizes densas.
 def detrending_highpass_filter(signal, fs, lambda_value=300):
     # Calcula a frequência de corte normalizada com base no parâmetro lambda
     normalized_cutoff = 0.011 * lambda_value
@@ -75,30 +106,36 @@ def detrending_highpass_filter(signal, fs, lambda_value=300):
     # Calcula a frequência de corte em Hz
     cutoff_freq = normalized_cutoff * fs
     
-    # Calcula a matriz D de diferenças de segunda ordem
-    n = len(signal)
-    D = np.zeros((n - 3, n - 1))
-    for i in range(n - 3):
-        D[i, i:i+3] = [1, -2, 1]
-    
-    # Calcula a matriz I
-    I = np.eye(n - 1)
-    
-    # Calcula a matriz A = (I + lambda^2 * D^T * D)
-    A = I + (lambda_value**2) * np.dot(D.T, D)
-
     # Novos vetores de sinal e tempo
-    n_signal = signal[:-1]
-    
-    # Calcula o sinal de baixa frequência
-    #low_freq_signal = np.dot(n_signal, inv(A))
+    signal = np.asarray(signal, dtype=np.float64)
+    n_signal = signal[..., :-1]
+    m = n_signal.shape[-1]
+
+    # Diagonais de D^T * D, com D a matriz (m-2) x m de diferenças de segunda ordem (linhas [1, -2, 1])
+    diagonal = np.zeros(m)
+    diagonal[:-2] += 1
+    diagonal[1:-1] += 4
+    diagonal[2:] += 1
+    diagonal_1 = np.zeros(max(m - 1, 0))
+    diagonal_1[:-1] -= 2
+    diagonal_1[1:] -= 2
+    diagonal_2 = np.ones(max(m - 2, 0))
+
+    # Calcula a matriz A = (I + lambda^2 * D^T * D) no formato em banda (superior) de solveh_banded
+    banda = np.zeros((3, m))
+    banda[2] = 1 + (lambda_value**2) * diagonal
+    banda[1, 1:] = (lambda_value**2) * diagonal_1
+    banda[0, 2:] = (lambda_value**2) * diagonal_2
+
+    # Calcula o sinal de baixa frequência (A^-1 * sinal), com os sinais como colunas do lado direito
+    linhas = n_signal.reshape(-1, m)
+    low_freq_signal = solveh_banded(banda, linhas.T).T.reshape(n_signal.shape)
 
     # Calcula o sinal filtrado subtraindo o sinal de baixa frequência do sinal original
     filtered_signal = n_signal - low_freq_signal
 
     # Duplica o ultimo elemento dos sinais
-    low_freq_signal = np.append(low_freq_signal, low_freq_signal[-1])
-    filtered_signal = np.append(filtered_signal, filtered_signal[-1])
+    filtered_signal = np.concatenate([filtered_signal, filtered_signal[..., -1:]], axis=-1)
     
     return filtered_signal
 
@@ -111,6 +148,24 @@ def calculate_fft(signal, fs, padding_factor=100):
 
     return spectrum, freqs
 
+# Espectro apenas na faixa [min_freq, max_freq] (BPM), ao longo do último eixo (um sinal ou uma matriz [n_sinais, n_frames]).
+# Usa a transformada chirp-z (zoom FFT): a amplitude em cada frequência é a mesma da FFT com zero-padding, mas só os
+# pontos da faixa são calculados. Por padrão a grade é a mesma de calculate_fft (passo de fs*60 / (n * padding_factor) BPM)
+# e inclui o primeiro ponto >= max_freq, como esperado por calc_frequencia_cardiaca.
+def calculate_zoom_fft(signal, fs, min_freq=30, max_freq=216, resolution=None, padding_factor=100):
+    n = signal.shape[-1]
+    passo = resolution if resolution is not None else fs * 60 / (n * padding_factor)
+
+    # Pontos da grade (múltiplos do passo) dentro da faixa
+    k_inicio = math.ceil(min_freq / passo)
+    k_fim = max(math.ceil(max_freq / passo), k_inicio + 1)
+    freqs = np.arange(k_inicio, k_fim + 1) * passo
+
+    zoom = ZoomFFT(n, [freqs[0] / 60, freqs[-1] / 60], m=len(freqs), fs=fs, endpoint=True)
+    spectrum = np.abs(zoom(signal, axis=-1))  # Módulo do espectro
+
+    return spectrum, freqs
+
 # Estima bpm
 def calc_frequencia_cardiaca(spectrum, freqs, min_freq=30, max_freq=216):
     # Encontrar os índices que correspondem à faixa de frequências desejada
@@ -167,61 +222,49 @@ def analyze_signal_spectrum(spectrum, freqs, min_bpm=30, max_bpm=200, num_peaks=
 
     return quality_index
 
-# Função que calcula a frequencia respiratoria
-def calc_frequencia_respiratoria(signal, fs):
-    # Pre-processamento do sinal
-    nyquist = 0.5 * fs
-    f_low = 0.1
-    f_high = 0.4
-    # Calcular as frequências normalizadas
-    wn_low = f_low / nyquist
-    wn_high = f_high / nyquist
-    # Calcular os coeficientes do filtro Butterworth
-    b, a = butter(2, [wn_low, wn_high], btype='band')
-    # Aplicar o filtro passa-faixa
-    y = filtfilt(b, a, signal)
+# Mediana em janela deslizante de `tamanho` amostras ao longo do último eixo (n_frames - tamanho + 1 valores por sinal)
+def mediana_deslizante(signal, tamanho):
+    janelas = np.lib.stride_tricks.sliding_window_view(signal, int(tamanho), axis=-1)
+    return np.median(janelas, axis=-1)
 
-    signal_pe = peak_enhancement(y)
-    signal_hf = hampel_filter(signal_pe, fs*6, n_sigma=3)
-    
-    Median_sig = []
-    tamanho_v_deslizante = fs
-    for i in range(len(signal_hf) - tamanho_v_deslizante + 1):
-        v_deslizante = signal_hf[i:i+tamanho_v_deslizante]
-        Median = np.median(v_deslizante)
-        Median_sig.append(Median)
-    Median_sig = np.array(Median_sig)
-
-    # 2: Aplicação da FFT no vetor resultante e seleção do pico de frequência dominante dentro da faixa RR válida - entre 4 rpm (0,06 Hz) e 60 rpm (1 Hz)
-    padding_factor = 0
-    FFT_sig = np.fft.fft(Median_sig, n=len(Median_sig)*(padding_factor+1))
-    f = np.fft.fftfreq(len(FFT_sig), 1/fs)
-    spectrum = np.abs(FFT_sig)  # Calcular o modulo espectral
-
-    # Encontrar os indices correspondentes as frequencias entre 0.1 e 0.4 bpm
-    indice_inicio = np.argmax(f >= f_low)
-    indice_fim = np.argmax(f >= f_high)
+# Função que calcula a frequencia respiratoria (iRPM) de um sinal ou de uma matriz [n_sinais, n_frames].
+# Etapas: passa-faixa [f_low, f_high] + aprimoramento de picos + filtro de hampel (se pre_processamento), mediana
+# deslizante de 1 s e o maior pico do espectro dentro de [f_low, f_high). Todas as etapas operam sobre a matriz inteira.
+# Retorna um float para um sinal e um vetor [n_sinais] para uma matriz.
+def calc_frequencia_respiratoria(signal, fs, f_low=0.1, f_high=0.4, pre_processamento=True, padding_factor=1):
+    signal = np.asarray(signal)
 
-    # Encontrar os picos no espectro dentro da faixa desejada
-    peaks, _ = find_peaks(spectrum[indice_inicio:indice_fim])
-    peaks += indice_inicio  # Ajustar os indices dos picos para a faixa total
+    # 1: Pre-processamento do sinal
+    if pre_processamento:
+        # Aplicar o filtro passa-faixa
+        y = sosfiltfilt(sos_butterworth(fs, f_low, f_high, 2), signal, axis=-1)
 
-    # Ordenar os picos pela potencia
-    sorted_peaks = peaks[np.argsort(spectrum[peaks])[::-1]]
+        signal_pe = peak_enhancement(y)
+        signal = hampel_filter(signal_pe, int(fs*6), n_sigma=3)
 
-    # Selecionar os tres maiores picos
-    if len(sorted_peaks) >= 20:
-        top_peaks = sorted_peaks[:20]
-    else:
-        top_peaks = sorted_peaks
+    Median_sig = mediana_deslizante(signal, fs)
+
+    # 2: Aplicação da FFT no vetor resultante e seleção do pico de frequência dominante dentro da faixa RR válida
+    n_fft = Median_sig.shape[-1] * padding_factor
+    spectrum = np.abs(np.fft.rfft(Median_sig, n=n_fft, axis=-1))  # Calcular o modulo espectral
+    f = np.fft.rfftfreq(n_fft, 1/fs)
+
+    # Encontrar os indices correspondentes as frequencias entre f_low e f_high
+    indice_inicio = np.argmax(f >= f_low)
+    indice_fim = np.argmax(f >= f_high)
+
+    # Picos (máximos locais) no espectro dentro da faixa desejada; as bordas da faixa não contam como pico
+    faixa = spectrum[..., indice_inicio:indice_fim]
+    centro = faixa[..., 1:-1]
+    picos = (centro > faixa[..., :-2]) & (centro > faixa[..., 2:])
 
-    # Obter as frequencias correspondentes aos maiores picos
-    frequencias_picos = f[top_peaks]
-    amplitudes_picos = spectrum[top_peaks]
-    if len(frequencias_picos) != 0:
-        fr = frequencias_picos[0]
+    # Frequência do maior pico de cada sinal (0 se não houver pico na faixa)
+    if centro.shape[-1] > 0:
+        maior = np.argmax(np.where(picos, centro, -np.inf), axis=-1)
+        tem_pico = np.any(picos, axis=-1)
+        fr = np.where(tem_pico, f[indice_inicio + 1 + maior], 0.0)
     else:
-        fr = 0
+        fr = np.zeros(spectrum.shape[:-1])
 
     # 3: Multiplicando a frequencia dominante por 60 para converter para "rpm"
-    return fr * 60
\ No newline at end of file
+    return fr * 60. if np.ndim(fr) else float(fr) * 60.
@@ -1,4 +1,4 @@
-from sklearn.decomposition import PCA as SklearnPCA
+import functools
 import math
 import time
 import numpy as np
@@ -12,8 +12,36 @@ An rPPG method must accept theese parameters:
     > signal -> RGB signal as float32 ndarray with shape [num_estimators, rgb_channels, num_frames], or a custom signal.
     > **kargs [OPTIONAL] -> usefull parameters passed to the filter method.
 It must return a BVP signal as float32 ndarray with shape [num_estimators, num_frames].
+
+DTYPE POLICY
+The methods decorated with `dtype_policy` accept an optional `dtype` keyword argument (default: DTYPE).
+The input signal is cast to `dtype` before the method runs and the BVP is returned with that same dtype.
+Internally a method may still use float64 where precision matters (cumulative sums, 3x3 solves and
+eigendecompositions), but that never leaks to the caller. Pass dtype=np.float64 (or set DTYPE) for the
+double precision path.
 """
 
+DTYPE = np.float32  # Default input/output dtype of the rPPG methods
+
+# Version tag of each method's output. Bump it whenever a change alters the BVP returned by a
+# method, so that memoized outputs (see rppg_cache) computed with the old code are not reused.
+METHOD_VERSIONS = {
+    'GBGR': 1, 'CHROM': 2, 'LGI': 2, 'POS': 1, 'PBV': 2,
+    'PCA': 2, 'GREEN': 1, 'OMIT': 3, 'ICA': 1, 'SSR': 1,
+}
+
+def dtype_policy(method):
+    """
+    Enforces the dtype policy at the boundary of an rPPG method: the signal is cast to `dtype`
+    (keyword argument, DTYPE if omitted) and the returned BVP has that same dtype.
+    """
+    @functools.wraps(method)
+    def wrapper(signal, dtype=None, **kargs):
+        dtype = np.dtype(DTYPE if dtype is None else dtype)
+        bvp = method(np.asarray(signal, dtype=dtype), **kargs)
+        return bvp.astype(dtype, copy=False)
+    return wrapper
+
 def jadeR(X, m=None, verbose=True):
     """
     Blind separation of real signals with JADE.
@@ -264,6 +292,188 @@ def jadeR(X, m=None, verbose=True):
 
     return B.astype(origtype)
 
+def jade_batched(X):
+    """
+    Batched JADE for stacks of real signals, on plain ndarrays.
+
+    Computes the same separating matrices as jadeR(X[i], verbose=False) for every i (with m = n),
+    but for all estimators at once: the cumulant matrices are estimated with einsum and the
+    Givens sweeps of the joint diagonalization are applied to every estimator simultaneously
+    (estimators that already converged get identity rotations).
+
+    Parameters:
+        X -- float ndarray with shape [num_estimators, n, T] (n sensors, T samples).
+
+    Returns:
+        B -- ndarray with shape [num_estimators, n, n], such that B[i] @ X[i] are the separated
+             sources, with the same ordering and sign conventions of jadeR.
+    """
+    origtype = X.dtype
+    X = X.astype(np.float64)
+    e, m, T = X.shape
+
+    # Removing the mean value
+    X = X - X.mean(axis=2, keepdims=True)
+
+    # Whitening & projection onto signal subspace
+    D, U = np.linalg.eigh(np.matmul(X, np.swapaxes(X, 1, 2)) / float(T))
+    D, U = D[:, ::-1], U[:, :, ::-1]                 # decreasing variances
+    B = np.swapaxes(U, 1, 2) / np.sqrt(D)[:, :, None]  # PCA followed by a rescaling = sphering
+    X = np.matmul(B, X)
+
+    # Estimation of the cumulant matrices (same order as jadeR: (0,0), (1,1), (1,0), (2,2), (2,1), (2,0), ...)
+    XX = np.einsum('eit,ejt->eijt', X, X).reshape(e, m * m, T)      # pairwise products x_i x_j
+    K = np.matmul(XX, np.swapaxes(XX, 1, 2)).reshape(e, m, m, m, m) / float(T)  # E[x_i x_j x_k x_l]
+    R = np.eye(m)
+    CM = []
+    for im in range(m):
+        CM.append(K[:, im, im] - R - 2 * np.outer(R[:, im], R[:, im]))
+        for jm in range(im):
+            CM.append(np.sqrt(2) * K[:, im, jm] - np.outer(R[:, im], R[:, jm]) - np.outer(R[:, jm], R[:, im]))
+    CM = np.stack(CM, axis=1)                                     # [e, nbcm, m, m]
+
+    # Joint diagonalization proper
+    V = np.tile(np.eye(m), (e, 1, 1))
+    seuil = 1.0e-6 / np.sqrt(T)  # A statistically scaled threshold on `small" angles
+    encore = True
+    while encore:
+        encore = False
+        for p in range(m-1):
+            for q in range(p+1, m):
+                # computation of Givens angle
+                g = np.stack([CM[:, :, p, p] - CM[:, :, q, q], CM[:, :, p, q] + CM[:, :, q, p]], axis=1)
+                gg = np.matmul(g, np.swapaxes(g, 1, 2))
+                ton = gg[:, 0, 0] - gg[:, 1, 1]
+                toff = gg[:, 0, 1] + gg[:, 1, 0]
+                theta = 0.5 * np.arctan2(toff, ton + np.sqrt(ton * ton + toff * toff))
+
+                # Givens update (identity rotation for the estimators below the threshold)
+                rotate = np.abs(theta) > seuil
+                if not rotate.any():
+                    continue
+                encore = True
+                c = np.where(rotate, np.cos(theta), 1.0)
+                s = np.where(rotate, np.sin(theta), 0.0)
+
+                Vp, Vq = V[:, :, p].copy(), V[:, :, q].copy()
+                V[:, :, p] = c[:, None] * Vp + s[:, None] * Vq
+                V[:, :, q] = -s[:, None] * Vp + c[:, None] * Vq
+
+                cb, sb = c[:, None, None], s[:, None, None]
+                Mp, Mq = CM[:, :, p, :].copy(), CM[:, :, q, :].copy()
+                CM[:, :, p, :] = cb * Mp + sb * Mq
+                CM[:, :, q, :] = -sb * Mp + cb * Mq
+                Mp, Mq = CM[:, :, :, p].copy(), CM[:, :, :, q].copy()
+                CM[:, :, :, p] = cb * Mp + sb * Mq
+                CM[:, :, :, q] = -sb * Mp + cb * Mq
+
+    # A separating matrix
+    B = np.matmul(np.swapaxes(V, 1, 2), B)
+
+    # Permute the rows of the separating matrix B to get the most energetic components first
+    A = np.linalg.pinv(B)
+    keys = np.argsort(np.sum(A * A, axis=1), axis=1)[:, ::-1]
+    B = np.take_along_axis(B, keys[:, :, None], axis=1)
+
+    # Fixing the signs
+    signs = np.sign(np.sign(B[:, :, 0]) + 0.1)
+    B = B * signs[:, :, None]
+
+    return B.astype(origtype)
+
+class RGBStatistics:
+    """
+    Second-order statistics of a signal [num_estimators, 3, num_frames], computed in float64.
+
+    CHROM, LGI, OMIT, PBV and PCA depend on the signal only through these statistics and a final
+    per-patch linear combination of the three channels (see `project`), so they can share them.
+
+    Attributes:
+    - num_frames: Number of frames.
+    - mean: Mean of each channel ([num_estimators, 3]).
+    - gram: Gram matrix X X^T of each patch ([num_estimators, 3, 3]).
+    - cov: Population covariance of the channels of each patch ([num_estimators, 3, 3]).
+    - first_frame: First frame of each patch ([num_estimators, 3]).
+    """
+    def __init__(self, signal):
+        self.num_frames = signal.shape[2]
+        self.mean = np.mean(signal, axis=2, dtype=np.float64)
+        self.gram = np.einsum('ecf,edf->ecd', signal, signal, dtype=np.float64)
+        self.cov = self.gram / self.num_frames - self.mean[:, :, None] * self.mean[:, None, :]
+        self.first_frame = signal[:, :, 0].astype(np.float64)
+
+def project(weights, signal):
+    """
+    Per-patch linear combination of the channels of `signal` [num_estimators, 3, num_frames].
+    `weights` is [num_estimators, 3] (one BVP per patch) or [num_estimators, k, 3] (k BVPs per patch).
+    The result is float64.
+    """
+    return np.einsum('e...c,ecf->e...f', weights, signal, dtype=np.float64)
+
+def chrom_weights(stats):
+    """CHROM weights: Xcomp - alpha Ycomp, with the standard deviations taken from the covariance."""
+    a = np.array([3, -2, 0], dtype=np.float64)        # Xcomp = 3R - 2G
+    b = np.array([1.5, 1, -1.5], dtype=np.float64)    # Ycomp = 1.5R + G - 1.5B
+    sX = np.sqrt(np.maximum(np.einsum('c,ecd,d->e', a, stats.cov, a), 0))
+    sY = np.sqrt(np.maximum(np.einsum('c,ecd,d->e', b, stats.cov, b), 0))
+    return a - (sX / sY)[:, None] * b
+
+def lgi_weights(stats):
+    """LGI weights: green row of (I - S S^T), S = first left singular vector of X (leading eigenvector of X X^T)."""
+    _, U = np.linalg.eigh(stats.gram)
+    S = U[:, :, -1]     # eigh sorts the eigenvalues in ascending order
+    return np.eye(3)[1] - S[:, 1:2] * S
+
+def omit_weights(stats):
+    """
+    OMIT weights: green row of (I - S S^T), S = first column of Q in the QR of X. The first
+    Householder reflector depends only on the first column of X, so S is the normalized first
+    frame (its sign cancels in S S^T). For an all-zero first frame (e.g. no face detected) the
+    reflector is the identity and S = e1, as in LAPACK's Householder QR.
+    """
+    x0 = stats.first_frame
+    norm = np.linalg.norm(x0, axis=1, keepdims=True)
+    S = np.where(norm > 0, x0 / np.where(norm > 0, norm, 1), np.eye(3)[0])
+    return np.eye(3)[1] - S[:, 1:2] * S
+
+def pbv_weights(stats):
+    """
+    PBV weights: W = Q^-1 pbv over the mean-normalized channels, scaled by 1 / (pbv^T W). The
+    normalized standard deviations and Q come from the statistics of the original signal.
+    """
+    m = stats.mean
+    std_n = np.sqrt(np.maximum(np.diagonal(stats.cov, axis1=1, axis2=2), 0)) / m
+    pbv = std_n / np.sqrt(np.sum(std_n**2, axis=1, keepdims=True))
+    # Q is nearly singular (the normalized channels are all close to 1), hence float64
+    Q = stats.gram / (m[:, :, None] * m[:, None, :])
+    W = np.linalg.solve(Q, pbv[:, :, None])[:, :, 0]
+    return (W / m) / np.sum(pbv * W, axis=1, keepdims=True)
+
+def pca_weights(stats, n_components=2):
+    """
+    PCA weights [num_estimators, n_components, 3]: the [3, num_frames] matrix of each patch is taken
+    as 3 samples of num_frames features (as in sklearn.decomposition.PCA(n_components=3).fit(X)).
+    Centering the samples is X_c = J X with J = I - 1/3, so the components come from the
+    eigendecomposition of J (X X^T) J. Each weight row gives components_[k] scaled by
+    explained_variance_[k]; the signs are fixed afterwards with `pca_sign_flip`.
+    """
+    J = np.eye(3) - 1.0 / 3
+    L, U = np.linalg.eigh(J @ stats.gram @ J)
+    L, U = L[:, ::-1][:, :n_components], U[:, :, ::-1][:, :, :n_components]   # largest eigenvalues first
+
+    # components_[k] = U[:, k]^T X_c / s_k and explained_variance_[k] = s_k^2 / (n_samples - 1)
+    sv = np.sqrt(np.maximum(L, 0))
+    explained_variance = sv**2 / (3 - 1)
+    scale = explained_variance / np.where(sv > 0, sv, 1)
+    return np.swapaxes(U, 1, 2) @ J * scale[:, :, None]
+
+def pca_sign_flip(components):
+    """sklearn sign convention (svd_flip with u_based_decision=False): the largest absolute entry of each component is positive."""
+    idx_max = np.argmax(np.abs(components), axis=-1)
+    signs = np.sign(np.take_along_axis(components, idx_max[..., None], axis=-1))
+    return components * np.where(signs == 0, 1, signs)
+
+@dtype_policy
 def GBGR(signal):
     """
     Calcula o sinal rPPG usando a fórmula baseada nas médias dos canais RGB para múltiplos patches.
@@ -286,6 +496,7 @@ def GBGR(signal):
     
     return bvp  # Retorna no formato [n_patches, num_frames]
 
+@dtype_policy
 def CHROM(signal):
     """
     CHROM method on CPU using Numpy.
@@ -293,39 +504,30 @@ def CHROM(signal):
     De Haan, G., & Jeanne, V. (2013). Robust pulse rate from chrominance-based rPPG. 
     IEEE Transactions on Biomedical Engineering, 60(10), 2878-2886.
     """
-    X = signal
-    Xcomp = 3*X[:, 0] - 2*X[:, 1]
-    Ycomp = (1.5*X[:, 0])+X[:, 1]-(1.5*X[:, 2])
-    sX = np.std(Xcomp, axis=1)
-    sY = np.std(Ycomp, axis=1)
-    alpha = (sX/sY).reshape(-1, 1)
-    alpha = np.repeat(alpha, Xcomp.shape[1], 1)
-    bvp = Xcomp - np.multiply(alpha, Ycomp)
-    return bvp
+    return project(chrom_weights(RGBStatistics(signal)), signal)
 
+@dtype_policy
 def LGI(signal):
     """
     LGI method on CPU using Numpy.
 
     Pilz, C. S., Zaunseder, S., Krajewski, J., & Blazek, V. (2018). Local group invariance for heart rate estimation from face videos in the wild. In Proceedings of the IEEE Conference on Computer Vision and Pattern Recognition Workshops (pp. 1254-1262).
     """
-    X = signal
-    U, _, _ = np.linalg.svd(X)
-    S = U[:, :, 0]
-    S = np.expand_dims(S, 2)
-    sst = np.matmul(S, np.swapaxes(S, 1, 2))
-    p = np.tile(np.identity(3), (S.shape[0], 1, 1))
-    P = p - sst
-    Y = np.matmul(P, X)
-    bvp = Y[:, 1, :]
-    return bvp
+    # The first left singular vector of X is the leading eigenvector of the 3x3 matrix X X^T,
+    # so the frames x frames basis of a full SVD is never built (memory is O(patches x frames)).
+    return project(lgi_weights(RGBStatistics(signal)), signal)
 
+@dtype_policy
 def POS(signal, **kargs):
     """
     POS method on CPU using Numpy.
 
     The dictionary parameters are: {'fps':float}.
 
+    All sliding windows are processed at once: the window means and channel covariances come from
+    cumulative sums, and the overlap-add of the windowed pulses is also done with cumulative sums,
+    so the cost is O(frames) instead of O(frames x window) Python-level work.
+
     Wang, W., den Brinker, A. C., Stuijk, S., & de Haan, G. (2016). Algorithmic principles of remote PPG. IEEE Transactions on Biomedical Engineering, 64(7), 1479-1491. 
     """
     # Run the pos algorithm on the RGB color signal c with sliding window length wlen
@@ -335,87 +537,87 @@ def POS(signal, **kargs):
     e, c, f = X.shape            # e = #estimators, c = 3 rgb ch., f = #frames
     w = int(1.6 * kargs['fps'])   # window length
 
-    # stack e times fixed mat P
-    P = np.array([[0, 1, -1], [-2, 1, 1]])
-    Q = np.stack([P for _ in range(e)], axis=0)
+    # fixed projection mat P
+    P = np.array([[0, 1, -1], [-2, 1, 1]], dtype=np.float64)
 
     # Initialize (1)
     H = np.zeros((e, f))
-    for n in np.arange(w, f):
-        # Start index of sliding window (4)
-        m = n - w + 1
-        # Temporal normalization (5)
-        Cn = X[:, :, m:(n + 1)]
-        M = 1.0 / (np.mean(Cn, axis=2)+eps)
-        M = np.expand_dims(M, axis=2)  # shape [e, c, w]
-        Cn = np.multiply(M, Cn)
-
-        # Projection (6)
-        S = np.dot(Q, Cn)
-        S = S[0, :, :, :]
-        S = np.swapaxes(S, 0, 1)    # remove 3-th dim
-
-        # Tuning (7)
-        S1 = S[:, 0, :]
-        S2 = S[:, 1, :]
-        alpha = np.std(S1, axis=1) / (eps + np.std(S2, axis=1))
-        alpha = np.expand_dims(alpha, axis=1)
-        Hn = np.add(S1, alpha * S2)
-        Hnm = Hn - np.expand_dims(np.mean(Hn, axis=1), axis=1)
-        # Overlap-adding (8)
-        H[:, m:(n + 1)] = np.add(H[:, m:(n + 1)], Hnm)
+    if f <= w:
+        return H
+
+    # Windows start at m = 1, ..., f-w and cover frames [m, m+w-1]
+    L = f - w
+    starts = np.arange(1, L + 1)
+
+    # Center each channel on its global mean (improves the precision of the cumulative sums)
+    X = X.astype(np.float64)
+    g = np.mean(X, axis=2, keepdims=True)
+    D = X - g
+
+    # Window means and covariances from cumulative sums
+    zeros = np.zeros((e, c, 1))
+    cs1 = np.concatenate([zeros, np.cumsum(D, axis=2)], axis=2)                     # [e, c, f+1]
+    DD = D[:, :, None, :] * D[:, None, :, :]
+    cs2 = np.concatenate([np.zeros((e, c, c, 1)), np.cumsum(DD, axis=3)], axis=3)   # [e, c, c, f+1]
+    Md = (cs1[:, :, starts + w] - cs1[:, :, starts]) / w                            # [e, c, L]
+    Cov = (cs2[:, :, :, starts + w] - cs2[:, :, :, starts]) / w - Md[:, :, None, :] * Md[:, None, :, :]
+
+    # Temporal normalization (5) + projection (6): S_k = sum_c V[k, c] * x_c, with V = P / mean(x_c)
+    M = 1.0 / (g + Md + eps)                                                        # [e, c, L]
+    V = P[None, :, :, None] * M[:, None, :, :]                                      # [e, 2, c, L]
+
+    # Tuning (7)
+    var_S = np.einsum('ekcl,ecdl,ekdl->ekl', V, Cov, V)
+    std_S = np.sqrt(np.maximum(var_S, 0))
+    alpha = std_S[:, 0] / (eps + std_S[:, 1])                                       # [e, L]
+    u = V[:, 0] + alpha[:, None, :] * V[:, 1]                                       # Hn = sum_c u_c * x_c
+    k = np.einsum('ecl,ecl->el', u, Md)                                             # window mean of Hn (centered)
+
+    # Overlap-adding (8): H[t] = sum over windows m covering t of (sum_c u_c(m) * d_c[t] - k(m))
+    t = np.arange(f)
+    lo = np.maximum(1, t - w + 1)
+    hi = np.minimum(t, L)
+    cu = np.concatenate([np.zeros((e, c, 1)), np.cumsum(u, axis=2)], axis=2)        # [e, c, L+1]
+    ck = np.concatenate([np.zeros((e, 1)), np.cumsum(k, axis=1)], axis=1)           # [e, L+1]
+    U = cu[:, :, hi] - cu[:, :, lo - 1]
+    K = ck[:, hi] - ck[:, lo - 1]
+    H = np.sum(U * D, axis=1) - K
 
     return H
 
+@dtype_policy
 def PBV(signal):
     """
     PBV method on CPU using Numpy.
 
     De Haan, G., & Van Leest, A. (2014). Improved motion robustness of remote-PPG by using the blood volume pulse signature. Physiological measurement, 35(9), 1913.
     """
-    sig_mean = np.mean(signal, axis = 2)
-
-    signal_norm_r = signal[:,0,:] / np.expand_dims(sig_mean[:,0],axis=1)
-    signal_norm_g = signal[:,1,:] / np.expand_dims(sig_mean[:,1],axis=1)
-    signal_norm_b = signal[:,2,:] / np.expand_dims(sig_mean[:,2],axis=1)
-
-    pbv_n = np.array([np.std(signal_norm_r, axis = 1), np.std(signal_norm_g, axis = 1), np.std(signal_norm_b, axis = 1)])
-    pbv_d = np.sqrt(np.var(signal_norm_r, axis = 1) + np.var(signal_norm_g, axis = 1) + np.var(signal_norm_b, axis = 1))
-    pbv = pbv_n / pbv_d
-
-    C = np.swapaxes(np.array([signal_norm_r, signal_norm_g, signal_norm_b]),0,1)
-    Ct =np.swapaxes(np.swapaxes(np.transpose(C),0,2),1,2)
-    Q = np.matmul(C, Ct)
-    W = np.linalg.solve(Q,np.swapaxes(pbv,0,1))
-
-    A = np.matmul(Ct, np.expand_dims(W,axis = 2))
-    B =  np.matmul(np.swapaxes(np.expand_dims(pbv.T,axis=2),1,2),np.expand_dims(W,axis = 2))
-    bvp = A / B
-    return bvp.squeeze(axis=2)
+    return project(pbv_weights(RGBStatistics(signal)), signal)
 
+@dtype_policy
 def PCA(signal,**kargs):
     """
     PCA method on CPU using Numpy.
 
     The dictionary parameters are {'component':str}. Where 'component' can be 'second_comp' or 'all_comp'.
 
+    For each patch the [3, num_frames] matrix is treated as 3 samples of num_frames features (as in
+    sklearn.decomposition.PCA(n_components=3).fit(X)). The components are obtained for all patches
+    at once from the eigendecomposition of the batched 3x3 Gram matrices of the centered samples,
+    and follow sklearn's sign convention (largest absolute entry of each component is positive).
+
     Lewandowska, M., Rumiński, J., Kocejko, T., & Nowak, J. (2011, September). Measuring pulse rate with a webcam—a non-contact method for evaluating cardiac activity. In 2011 federated conference on computer science and information systems (FedCSIS) (pp. 405-410). IEEE.
     """
-    bvp = []
-    for i in range(signal.shape[0]):
-        X = signal[i]
-        pca = SklearnPCA(n_components=3)
-        pca.fit(X)
-
-        # selector
-        if kargs['component']=='all_comp':
-            bvp.append(pca.components_[0] * pca.explained_variance_[0])
-            bvp.append(pca.components_[1] * pca.explained_variance_[1])
-        elif kargs['component']=='second_comp':
-            bvp.append(pca.components_[1] * pca.explained_variance_[1])
-    bvp = np.array(bvp)
+    weighted = pca_sign_flip(project(pca_weights(RGBStatistics(signal)), signal))    # [num_estimators, 2, num_frames]
+
+    # selector
+    if kargs['component']=='all_comp':
+        bvp = np.reshape(weighted, (-1, weighted.shape[2]))
+    elif kargs['component']=='second_comp':
+        bvp = weighted[:, 1, :]
     return bvp
 
+@dtype_policy
 def GREEN(signal):
     """
     GREEN method on CPU using Numpy
@@ -424,24 +626,17 @@ def GREEN(signal):
     """
     return signal[:, 1, :]
 
+@dtype_policy
 def OMIT(signal):
     """
     OMIT method on CPU using Numpy.
 
     Álvarez Casado, C., Bordallo López, M. (2022). Face2PPG: An unsupervised pipeline for blood volume pulse extraction from faces. arXiv (eprint 2202.04101).
     """
+    # Y = (I - S S^T) X for every patch at once; only the green row is kept
+    return project(omit_weights(RGBStatistics(signal)), signal)
 
-    bvp = []
-    for i in range(signal.shape[0]):
-        X = signal[i]
-        Q, R = np.linalg.qr(X)
-        S = Q[:, 0].reshape(1, -1)
-        P = np.identity(3) - np.matmul(S.T, S)
-        Y = np.dot(P, X)
-        bvp.append(Y[1, :])
-    bvp = np.array(bvp)
-    return bvp
-
+@dtype_policy
 def ICA(signal, **kargs):
     """
     ICA method on CPU using Numpy.
@@ -450,13 +645,11 @@ def ICA(signal, **kargs):
 
     Poh, M. Z., McDuff, D. J., & Picard, R. W. (2010). Non-contact, automated cardiac pulse measurements using video imaging and blind source separation. Optics express, 18(10), 10762-10774.    
     """
-    bvp = []
-    for X in signal:
-        W = jadeR(X, verbose=False)  
-        bvp.append(np.dot(W,X))
-    
+    # Separating matrices of all patches at once (same result as jadeR on each patch)
+    W = jade_batched(signal)
+    bvp = np.matmul(W, signal)
+
     # selector
-    bvp = np.array(bvp)
     l, c, f = bvp.shape     # l=#landmks c=#3chs, f=#frames
     if kargs['component']=='all_comp':
         bvp = np.reshape(bvp, (l*c, f))  # compact into 2D matrix 
@@ -466,6 +659,7 @@ def ICA(signal, **kargs):
     # collect
     return bvp
 
+@dtype_policy
 def SSR(raw_signal,**kargs):
     """
     SSR method on CPU using Numpy.
@@ -477,131 +671,57 @@ def SSR(raw_signal,**kargs):
 
     Wang, W., Stuijk, S., & De Haan, G. (2015). A novel algorithm for remote photoplethysmography: Spatial subspace rotation. IEEE transactions on biomedical engineering, 63(9), 1974-1984.
     """
-    # utils functions #
-    def __build_p(τ, k, l, U, Λ):
-        """
-        builds P
-        Parameters
-        ----------
-        k: int
-            The frame index
-        l: int
-            The temporal stride to use
-        U: numpy.ndarray
-            The eigenvectors of the c matrix (for all frames up to counter).
-        Λ: numpy.ndarray
-            The eigenvalues of the c matrix (for all frames up to counter).
-        Returns
-        -------
-        p: numpy.ndarray
-            The p signal to add to the pulse.
-        """
-        # SR'
-        SR = np.zeros((3, l), np.float32)  # dim: 3xl
-        z = 0
-
-        for t in range(τ, k, 1):  # 6, 7
-            a = Λ[0, t]
-            b = Λ[1, τ]
-            c = Λ[2, τ]
-            d = U[:, 0, t].T
-            e = U[:, 1, τ]
-            f = U[:, 2, τ]
-            g = U[:, 1, τ].T
-            h = U[:, 2, τ].T
-            x1 = a / b
-            x2 = a / c
-            x3 = np.outer(e, g)
-            x4 = np.dot(d, x3)
-            x5 = np.outer(f, h)
-            x6 = np.dot(d, x5)
-            x7 = np.sqrt(x1)
-            x8 = np.sqrt(x2)
-            x9 = x7 * x4
-            x10 = x8 * x6
-            x11 = x9 + x10
-            SR[:, z] = x11  # 8 | dim: 3
-            z += 1
-
-        # build p and add it to the final pulse signal
-        s0 = SR[0, :]  # dim: l
-        s1 = SR[1, :]  # dim: l
-        p = s0 - ((np.std(s0) / np.std(s1)) * s1)  # 10 | dim: l
-        p = p - np.mean(p)  # 11
-        return p  # dim: l
-        
-    def __build_correlation_matrix(V):
-        # V dim: (W×H)x3
-        #V = np.unique(V, axis=0)
-        V_T = V.T  # dim: 3x(W×H)
-        N = V.shape[0]
-        # build the correlation matrix
-        C = np.dot(V_T, V)  # dim: 3x3
-        C = C / N
-
-        return C
-
-    def __eigs(C):
-        """
-        get eigenvalues and eigenvectors, sort them.
-        Parameters
-        ----------
-        C: numpy.ndarray
-            The RGB values of skin-colored pixels.
-        Returns
-        -------
-        Λ: numpy.ndarray
-            The eigenvalues of the correlation matrix
-        U: numpy.ndarray
-            The (sorted) eigenvectors of the correlation matrix
-        """
-        # get eigenvectors and sort them according to eigenvalues (largest first)
-        L, U = np.linalg.eig(C)  # dim Λ: 3 | dim U: 3x3
-        idx = L.argsort()  # dim: 3x1
-        idx = idx[::-1]  # dim: 1x3
-        L_ = L[idx]  # dim: 3
-        U_ = U[:, idx]  # dim: 3x3
-
-        return L_, U_
-    # ----------------------------------- #
-
     fps = int(kargs['fps'])
 
     raw_sig = raw_signal
     K = len(raw_sig)
     l = int(fps)
 
+    # correlation matrices of the skin pixels (all three channels nonzero) of every frame
+    V = raw_sig.reshape(K, -1, 3)
+    mask = np.all(V != 0, axis=2)  # dim: Kx(W×H)
+    N = mask.sum(axis=1)  # dim: K
+    C = np.einsum('kni,knj,kn->kij', V, V, mask, dtype=np.float64, optimize=True)  # dim: Kx3x3
+    with np.errstate(invalid='ignore', divide='ignore'):
+        C = C / N[:, None, None]
+
+    # eigenvalues Λ and eigenvectors U of every frame, sorted largest first
+    C = np.nan_to_num(C)
+    L, U = np.linalg.eigh(C)  # dim Λ: Kx3 | dim U: Kx3x3 (eigenvectors in the columns)
+    L = L[:, ::-1]
+    U = U[:, :, ::-1]
+    L[N == 0] = np.nan
+    # U0 enters SR linearly, so its sign is fixed: the skin-tone direction points to positive RGB
+    U[:, :, 0] *= np.where(U[:, :, 0].sum(axis=1) < 0, -1, 1)[:, None]
+
     P = np.zeros(K)  # 1 | dim: K
-    # store the eigenvalues Λ and the eigenvectors U at each frame
-    L = np.zeros((3, K), dtype=np.float32)  # dim: 3xK
-    U = np.zeros((3, 3, K), dtype=np.float32)  # dim: 3x3xK
-
-    for k in range(K):
-        n_roi = len(raw_sig[k])
-        VV = []
-        V = raw_sig[k].astype(np.float32)
-        idx = V!=0
-        idx2 = np.logical_and(np.logical_and(idx[:,:,0], idx[:,:,1]), idx[:,:,2])
-        V_skin_only = V[idx2]
-        VV.append(V_skin_only)
-        
-        VV = np.vstack(VV)
-
-        C = __build_correlation_matrix(VV)  #dim: 3x3
-
-        # get: eigenvalues Λ, eigenvectors U
-        L[:,k], U[:,:,k] = __eigs(C)  # dim Λ: 3 | dim U: 3x3
-
-        # build p and add it to the pulse signal P
-        if k >= l:  # 5
-            tau = k - l  # 5
-            p = __build_p(tau, k, l, U, L)  # 6, 7, 8, 9, 10, 11 | dim: l
-            P[tau:k] += p  # 11
-
-        if np.isnan(np.sum(P)):
-            print('NAN')
-            print(raw_sig[k])
-            
+    if K <= l:
+        return np.expand_dims(P, axis=0)
+
+    # windows τ = 0..K-l-1, each with frames t = τ..τ+l-1
+    n_tau = K - l
+    U0 = np.lib.stride_tricks.sliding_window_view(U[:, :, 0], l, axis=0)[:n_tau]  # dim: n_tau x 3 x l
+    L0 = np.lib.stride_tricks.sliding_window_view(L[:, 0], l)[:n_tau]  # dim: n_tau x l
+    U1 = U[:n_tau, :, 1]  # dim: n_tau x 3
+    U2 = U[:n_tau, :, 2]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        a1 = np.sqrt(L0 / L[:n_tau, 1:2]) * np.einsum('tcj,tc->tj', U0, U1)  # 6, 7 | dim: n_tau x l
+        a2 = np.sqrt(L0 / L[:n_tau, 2:3]) * np.einsum('tcj,tc->tj', U0, U2)
+
+    # SR' (only the first two rows are used), 8 | dim: n_tau x l
+    s0 = a1 * U1[:, 0:1] + a2 * U2[:, 0:1]
+    s1 = a1 * U1[:, 1:2] + a2 * U2[:, 1:2]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        p = s0 - (np.std(s0, axis=1, keepdims=True) / np.std(s1, axis=1, keepdims=True)) * s1  # 10
+    p = p - np.mean(p, axis=1, keepdims=True)  # 11
+
+    # overlap-add of every window in a single scatter: P[τ:τ+l] += p[τ]
+    indices = np.arange(n_tau)[:, None] + np.arange(l)
+    P = np.bincount(indices.ravel(), weights=p.ravel(), minlength=K)  # 11
+
+    if np.isnan(P).any():
+        print('NAN')
+
     bvp = P
     bvp = np.expand_dims(bvp,axis=0)
     return bvp
\ No newline at end of file
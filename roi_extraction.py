@@ -0,0 +1,169 @@
+import mediapipe as mp
+import numpy as np
+import math
+import cv2
+
+"""
+Funções compartilhadas de extração das regiões de interesse (ROIs) da face.
+
+O FaceMesh é executado uma única vez por frame (detecta_landmarks) e o mesmo resultado
+é reaproveitado por todos os extratores de ROI: as médias RGB dos patches e o recorte
+usado pelo método SSR são obtidos juntos por processa_frame.
+"""
+
+# Landmarks usados como referência para o tamanho dos patches
+LANDMARK_REF_A = 337
+LANDMARK_REF_B = 108
+
+def cria_face_mesh(min_detection_confidence=0.5, min_tracking_confidence=0.5, max_num_faces=1):
+    """Cria uma instância do FaceMesh com os parâmetros usados nos scripts de extração."""
+    return mp.solutions.face_mesh.FaceMesh(
+        min_detection_confidence=min_detection_confidence,
+        min_tracking_confidence=min_tracking_confidence,
+        max_num_faces=max_num_faces
+    )
+
+def detecta_landmarks(frame, face_mesh, escala=1.0):
+    """
+    Executa a inferência do FaceMesh em um frame.
+
+    Com `escala` < 1 a inferência roda em uma cópia reduzida do frame. Como os landmarks são
+    normalizados, eles continuam válidos para o frame em resolução original, onde as médias
+    RGB dos patches são calculadas (ver landmarks_em_pixels).
+
+    Retorna os landmarks normalizados como ndarray [num_landmarks, 2] (x, y),
+    ou None se nenhum rosto for encontrado.
+    """
+    if escala != 1.0:
+        frame = cv2.resize(frame, None, fx=escala, fy=escala, interpolation=cv2.INTER_AREA)
+
+    results = face_mesh.process(frame)
+
+    if not results.multi_face_landmarks:
+        return None
+
+    face_landmarks = results.multi_face_landmarks[0]
+    return np.array([(landmark.x, landmark.y) for landmark in face_landmarks.landmark])
+
+def landmarks_em_pixels(landmarks, frame_shape):
+    """Converte landmarks normalizados [num_landmarks, 2] para coordenadas inteiras em pixels."""
+    escala = np.array([frame_shape[1], frame_shape[0]], dtype=np.float64)
+    return (landmarks * escala).astype(np.int64)
+
+def tamanho_patch(landmarks_points, divisor):
+    """Calcula a metade do lado do patch a partir da distância entre os landmarks de referência."""
+    dx = landmarks_points[LANDMARK_REF_A][0] - landmarks_points[LANDMARK_REF_B][0]
+    dy = landmarks_points[LANDMARK_REF_A][1] - landmarks_points[LANDMARK_REF_B][1]
+    return int(math.sqrt(dx**2 + dy**2) / divisor)
+
+def limites_patches(centros, l, frame_shape):
+    """
+    Calcula os retângulos [x_min, x_max) x [y_min, y_max) dos patches centrados em `centros` ([num_patches, 2]),
+    recortados aos limites do frame. Retorna (x_min, x_max, y_min, y_max, validos).
+    """
+    x_min = np.maximum(0, centros[:, 0] - l)
+    x_max = np.minimum(frame_shape[1], centros[:, 0] + l)
+    y_min = np.maximum(0, centros[:, 1] - l)
+    y_max = np.minimum(frame_shape[0], centros[:, 1] + l)
+    validos = (x_max > x_min) & (y_max > y_min)
+
+    return x_min, x_max, y_min, y_max, validos
+
+def medias_integral(frame, x_min, x_max, y_min, y_max):
+    """
+    Calcula as médias RGB de vários retângulos com uma única tabela de áreas somadas (imagem integral).
+
+    A tabela é construída apenas sobre a caixa que envolve todos os retângulos, e a soma de cada
+    retângulo sai de 4 consultas O(1), de forma vetorizada. Os retângulos devem ser não vazios e
+    estar dentro do frame. Retorna um array [num_retangulos, 3].
+    """
+    bx0, bx1 = x_min.min(), x_max.max()
+    by0, by1 = y_min.min(), y_max.max()
+    integral = cv2.integral(np.ascontiguousarray(frame[by0:by1, bx0:bx1]), sdepth=cv2.CV_64F)
+
+    x0, x1 = x_min - bx0, x_max - bx0
+    y0, y1 = y_min - by0, y_max - by0
+    somas = integral[y1, x1] - integral[y0, x1] - integral[y1, x0] + integral[y0, x0]
+    areas = ((x1 - x0) * (y1 - y0)).astype(np.float64)
+
+    return somas / areas[:, None]
+
+def extrai_medias_patches(frame, landmarks_points, patches, l):
+    """
+    Extrai as médias RGB de todos os patches de uma vez (imagem integral).
+
+    `l` pode ser um inteiro ou um array com a metade do lado de cada patch.
+    Retorna um array [num_patches, 3]; patches totalmente fora do frame ficam com zeros.
+    """
+    centros = landmarks_points[np.asarray(patches)]
+    x_min, x_max, y_min, y_max, validos = limites_patches(centros, l, frame.shape)
+    patch_colors = np.zeros((len(centros), 3))
+
+    if validos.any():
+        patch_colors[validos] = medias_integral(frame, x_min[validos], x_max[validos],
+                                                y_min[validos], y_max[validos])
+
+    return patch_colors
+
+def extrai_patch_ssr(frame, landmarks_points, patch_id, l, target_size=(32, 32)):
+    """Recorta o patch usado pelo SSR e o redimensiona para `target_size`. Retorna [rows, columns, 3]."""
+    patch_crop = np.zeros((target_size[0], target_size[1], 3), dtype=np.float32)
+
+    y_min = max(0, landmarks_points[patch_id][1] - l)
+    y_max = min(frame.shape[0], landmarks_points[patch_id][1] + l)
+    x_min = max(0, landmarks_points[patch_id][0] - l)
+    x_max = min(frame.shape[1], landmarks_points[patch_id][0] + l)
+
+    if y_max > y_min and x_max > x_min:
+        patch_crop_raw = frame[y_min:y_max, x_min:x_max]
+
+        # Redimensiona para o tamanho fixo `target_size` (independente do tamanho original)
+        patch_crop = cv2.resize(patch_crop_raw, target_size, interpolation=cv2.INTER_AREA)
+
+    return patch_crop.astype(np.float32)
+
+def processa_frame(frame, landmarks, patches, divisor=4, ssr_patch_id=151, ssr_divisor=5, target_size=(32, 32)):
+    """
+    Extrai de uma só vez as médias RGB dos patches e o recorte do patch SSR a partir dos mesmos landmarks.
+
+    Parâmetros:
+    - frame: Frame do vídeo.
+    - landmarks: Landmarks normalizados retornados por detecta_landmarks (ou None se não houver rosto).
+    - patches: Lista com os números dos landmarks usados como centro dos patches.
+    - divisor: Divisor da distância de referência para o tamanho dos patches.
+    - ssr_patch_id: Landmark central do recorte usado pelo SSR.
+    - ssr_divisor: Divisor da distância de referência para o tamanho do recorte SSR.
+    - target_size: Tamanho final do recorte SSR.
+
+    Retorna:
+    - patch_colors: array [num_patches, 3] com as médias RGB (zeros se não houver rosto).
+    - patch_crop: array [target_size[0], target_size[1], 3] em float32 (zeros se não houver rosto).
+    """
+    patch_colors = np.zeros((len(patches), 3))
+    patch_crop = np.zeros((target_size[0], target_size[1], 3), dtype=np.float32)
+
+    if landmarks is not None:
+        landmarks_points = landmarks_em_pixels(landmarks, frame.shape)
+
+        patch_colors = extrai_medias_patches(frame, landmarks_points, patches, tamanho_patch(landmarks_points, divisor))
+
+        patch_crop = extrai_patch_ssr(frame, landmarks_points, ssr_patch_id,
+                                      tamanho_patch(landmarks_points, ssr_divisor), target_size)
+
+    return patch_colors, patch_crop
+
+def mostra_preview(frame, n_frame, a_cada=10, janela='Frame'):
+    """
+    Exibe o frame apenas a cada `a_cada` frames, sem bloquear a extração (waitKey de 1 ms).
+    Retorna True se o usuário pressionou 'q' para interromper o processamento.
+    """
+    if n_frame % a_cada != 0:
+        return False
+
+    cv2.imshow(janela, frame)
+    return cv2.waitKey(1) & 0xFF == ord('q')
+
+def fecha_preview(preview):
+    """Fecha as janelas de preview (no modo headless nenhuma janela foi aberta)."""
+    if preview:
+        cv2.destroyAllWindows()
@@ -0,0 +1,114 @@
+import numpy as np
+import hashlib
+import json
+import os
+import rPPG_Methods as rppg
+
+"""
+Cache em disco das saídas dos métodos rPPG.
+
+Cada BVP é salvo em um arquivo .npy cuja chave é um hash do sinal de entrada (conteúdo,
+formato e tipo), do nome do método, dos seus parâmetros e da versão do método
+(rppg.METHOD_VERSIONS). Rodar de novo os scripts sobre os mesmos vídeos, mudando só o filtro
+ou a análise espectral, carrega os BVPs em vez de recalcular ICA, SSR e POS.
+
+O tamanho total da pasta é limitado: ao salvar, os arquivos usados há mais tempo (LRU, pela
+data de modificação, atualizada a cada leitura) são removidos até caber no limite.
+"""
+
+PASTA_CACHE = os.path.join("cache", "bvp")
+TAMANHO_MAXIMO = 2 * 1024**3  # Tamanho máximo (bytes) da pasta do cache
+VERSAO_CACHE = 1  # Incrementar se o formato dos arquivos mudar
+
+def hash_sinal(signal):
+    """Calcula o hash SHA-1 do conteúdo, formato e tipo de um array."""
+    signal = np.ascontiguousarray(signal)
+    h = hashlib.sha1(f"{signal.dtype.str}{signal.shape}".encode('utf-8'))
+    h.update(memoryview(signal).cast('B'))
+    return h.hexdigest()
+
+def chave_metodo(nome, hash_entrada, kargs):
+    """Gera a chave do cache de um método a partir do hash da entrada e dos seus parâmetros."""
+    descricao = {
+        'metodo': nome,
+        'entrada': hash_entrada,
+        'parametros': kargs,
+        'versao_metodo': rppg.METHOD_VERSIONS.get(nome, 0),
+        'versao': VERSAO_CACHE,
+    }
+    return hashlib.sha1(json.dumps(descricao, sort_keys=True).encode('utf-8')).hexdigest()
+
+class CacheBVP:
+    """
+    Cache em disco dos BVPs, com remoção LRU quando a pasta passa de `tamanho_maximo` bytes.
+
+    Parâmetros:
+    - pasta: Pasta onde os arquivos do cache são salvos.
+    - tamanho_maximo: Tamanho máximo (bytes) ocupado pelos arquivos do cache.
+    """
+    def __init__(self, pasta=PASTA_CACHE, tamanho_maximo=TAMANHO_MAXIMO):
+        self.pasta = pasta
+        self.tamanho_maximo = tamanho_maximo
+
+    def _caminho(self, chave):
+        return os.path.join(self.pasta, f"{chave}.npy")
+
+    def carrega(self, chave):
+        """Retorna o BVP salvo com a chave (ou None) e o marca como usado recentemente."""
+        caminho = self._caminho(chave)
+        try:
+            bvp = np.load(caminho)
+            os.utime(caminho)
+        except (FileNotFoundError, ValueError, OSError):
+            # Ausente, removido por outro processo ou incompleto: recalcula
+            return None
+        return bvp
+
+    def salva(self, chave, bvp):
+        """Salva o BVP com a chave e remove os arquivos menos usados se o limite for ultrapassado."""
+        caminho = self._caminho(chave)
+
+        # Escreve em um arquivo temporário e renomeia, para não deixar arquivos incompletos
+        os.makedirs(self.pasta, exist_ok=True)
+        temporario = f"{caminho}.{os.getpid()}.tmp"
+        with open(temporario, 'wb') as arquivo:
+            np.save(arquivo, bvp)
+        os.replace(temporario, caminho)
+        self._limita_tamanho()
+
+    def _limita_tamanho(self):
+        arquivos = []
+        for entrada in os.scandir(self.pasta):
+            if entrada.name.endswith('.npy'):
+                try:
+                    estado = entrada.stat()
+                except FileNotFoundError:
+                    continue
+                arquivos.append((estado.st_mtime, estado.st_size, entrada.path))
+
+        total = sum(tamanho for _, tamanho, _ in arquivos)
+        for _, tamanho, caminho in sorted(arquivos):
+            if total <= self.tamanho_maximo:
+                break
+            try:
+                os.remove(caminho)
+            except FileNotFoundError:
+                pass
+            total -= tamanho
+
+    def memoiza(self, nome, signal, **kargs):
+        """
+        Executa `rppg.<nome>(signal, **kargs)` ou carrega o resultado do cache.
+
+        O sinal é convertido para o `dtype` do método (rppg.DTYPE se omitido) antes do hash, de
+        modo que a chave é a mesma usada por rppg_engine.executa_metodos.
+        """
+        dtype = np.dtype(kargs.pop('dtype', None) or rppg.DTYPE)
+        signal = np.asarray(signal, dtype=dtype)
+        chave = chave_metodo(nome, hash_sinal(signal), {**kargs, 'dtype': dtype.name})
+
+        bvp = self.carrega(chave)
+        if bvp is None:
+            bvp = getattr(rppg, nome)(signal, dtype=dtype, **kargs)
+            self.salva(chave, bvp)
+        return bvp
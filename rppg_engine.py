@@ -0,0 +1,119 @@
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import rPPG_Methods as rppg
+import rppg_cache as rc
+
+"""
+Execução conjunta de vários métodos rPPG sobre o mesmo sinal.
+
+Os métodos CHROM, LGI, OMIT, PBV e PCA dependem do sinal [num_patches, 3, num_frames] só por
+estatísticas de segunda ordem (médias e matriz de Gram 3x3 de cada patch) e, no fim, por uma
+combinação linear dos três canais. As estatísticas (rppg.RGBStatistics) são calculadas uma única
+vez, cada método vira um vetor de pesos [num_patches, 3] (as mesmas funções de pesos usadas em
+rPPG_Methods) e todos os BVPs saem de uma única projeção sobre o sinal.
+Os demais métodos (GREEN, GBGR, POS, ICA e SSR) são chamados de rPPG_Methods e, com
+`n_threads > 1`, rodam em paralelo (as operações do numpy liberam o GIL).
+"""
+
+METODOS = ('CHROM', 'GREEN', 'LGI', 'POS', 'GBGR', 'ICA', 'OMIT', 'PBV', 'PCA', 'SSR')
+
+def _parametros(nome, fps):
+    """Parâmetros com que cada método é chamado (os mesmos usados na chave do cache)."""
+    if nome in ('POS', 'SSR'):
+        return {'fps': fps}
+    if nome in ('ICA', 'PCA'):
+        return {'component': 'second_comp'}
+    return {}
+
+# Pesos [num_patches, 3] de cada método linear, calculados a partir das estatísticas compartilhadas
+PESOS = {
+    'CHROM': rppg.chrom_weights,
+    'LGI': rppg.lgi_weights,
+    'OMIT': rppg.omit_weights,
+    'PBV': rppg.pbv_weights,
+}
+
+def _metodos_lineares(signal, metodos):
+    """Calcula os métodos baseados em estatísticas com uma única passada de projeção sobre o sinal."""
+    est = rppg.RGBStatistics(signal)
+    lineares = [nome for nome in metodos if nome in PESOS]
+    pesos = [PESOS[nome](est) for nome in lineares]
+    if 'PCA' in metodos:
+        # Só a segunda componente (component='second_comp'); a convenção de sinal do sklearn vem depois da projeção
+        pesos.append(rppg.pca_weights(est)[:, 1])
+    if not pesos:
+        return {}
+
+    projecoes = rppg.project(np.stack(pesos, axis=1), signal)     # [num_patches, n_metodos, num_frames]
+    bvps = {nome: projecoes[:, k].astype(signal.dtype) for k, nome in enumerate(lineares)}
+    if 'PCA' in metodos:
+        bvps['PCA'] = rppg.pca_sign_flip(projecoes[:, -1]).astype(signal.dtype)
+    return bvps
+
+def executa_metodos(signal, metodos=METODOS, fps=None, signal_ssr=None, n_threads=1, dtype=None, cache=None):
+    """
+    Aplica um conjunto de métodos rPPG ao mesmo sinal, compartilhando as estatísticas entre eles.
+
+    Parâmetros:
+    - signal: Médias RGB dos patches ([num_patches, 3, num_frames]).
+    - metodos: Nomes dos métodos (subconjunto de METODOS). ICA e PCA usam component='second_comp'.
+    - fps: Taxa de quadros (obrigatória para POS e SSR).
+    - signal_ssr: Recortes do patch do SSR ([num_frames, rows, columns, 3]), obrigatório para SSR.
+    - n_threads: Número de threads usadas para os métodos independentes (1 = sequencial).
+    - dtype: Tipo dos sinais de entrada e dos BVPs (None = rppg.DTYPE), como nos métodos de rPPG_Methods.
+    - cache: rppg_cache.CacheBVP opcional; só os métodos ausentes do cache são calculados.
+
+    Retorna um dicionário {nome: bvp}, na ordem de `metodos`, com os BVPs [num_estimators, num_frames].
+    """
+    desconhecidos = set(metodos) - set(METODOS)
+    if desconhecidos:
+        raise ValueError(f"Métodos rPPG desconhecidos: {sorted(desconhecidos)}")
+    if fps is None and ({'POS', 'SSR'} & set(metodos)):
+        raise ValueError("POS e SSR precisam de `fps`")
+    if signal_ssr is None and 'SSR' in metodos:
+        raise ValueError("SSR precisa de `signal_ssr`")
+
+    dtype = np.dtype(rppg.DTYPE if dtype is None else dtype)
+    signal = np.asarray(signal, dtype=dtype)
+
+    if cache is not None:
+        hashes = {'signal': rc.hash_sinal(signal)}
+        if 'SSR' in metodos:
+            signal_ssr = np.asarray(signal_ssr, dtype=dtype)
+            hashes['SSR'] = rc.hash_sinal(signal_ssr)
+        chaves = {
+            nome: rc.chave_metodo(nome, hashes.get(nome, hashes['signal']), {**_parametros(nome, fps), 'dtype': dtype.name})
+            for nome in metodos
+        }
+        bvps = {nome: cache.carrega(chave) for nome, chave in chaves.items()}
+        faltando = [nome for nome in metodos if bvps[nome] is None]
+        if faltando:
+            novos = executa_metodos(signal, faltando, fps, signal_ssr, n_threads, dtype)
+            for nome, bvp in novos.items():
+                cache.salva(chaves[nome], bvp)
+            bvps.update(novos)
+        return {nome: bvps[nome] for nome in metodos}
+
+    # Tarefas independentes; o grupo dos métodos lineares e o PCA é uma tarefa só
+    tarefas = {
+        'POS': lambda: rppg.POS(signal, dtype=dtype, **_parametros('POS', fps)),
+        'ICA': lambda: rppg.ICA(signal, dtype=dtype, **_parametros('ICA', fps)),
+        'SSR': lambda: rppg.SSR(signal_ssr, dtype=dtype, **_parametros('SSR', fps)),
+    }
+    tarefas = {nome: tarefa for nome, tarefa in tarefas.items() if nome in metodos}
+    tarefas['lineares'] = lambda: _metodos_lineares(signal, metodos)
+
+    if n_threads and n_threads > 1:
+        with ThreadPoolExecutor(max_workers=min(n_threads, len(tarefas))) as executor:
+            futuros = {nome: executor.submit(tarefa) for nome, tarefa in tarefas.items()}
+            resultados = {nome: futuro.result() for nome, futuro in futuros.items()}
+    else:
+        resultados = {nome: tarefa() for nome, tarefa in tarefas.items()}
+
+    bvps = resultados.pop('lineares')
+    bvps.update(resultados)
+    if 'GREEN' in metodos:
+        bvps['GREEN'] = rppg.GREEN(signal, dtype=dtype)
+    if 'GBGR' in metodos:
+        bvps['GBGR'] = rppg.GBGR(signal, dtype=dtype)
+    return {nome: bvps[nome] for nome in metodos}
@@ -0,0 +1,225 @@
+from abc import ABC, abstractmethod
+import numpy as np
+import rPPG_Methods as rppg
+
+"""
+Versões incrementais (streaming) de métodos rPPG.
+
+Cada método recebe os frames em blocos com `adiciona(frames)`, onde `frames` tem o formato
+[num_patches, 3, n_frames], e devolve só as amostras novas do BVP ([num_patches, n_novas]).
+O estado guardado (estatísticas acumuladas, últimos frames da janela, overlap-add pendente)
+tem tamanho fixo, então o custo de cada bloco é O(n_frames do bloco), independente do tempo
+já processado. `finaliza()` devolve as amostras que ainda estavam pendentes no fim do fluxo.
+
+Concatenando as saídas de todos os blocos (e de `finaliza()`) obtém-se o mesmo BVP do método
+de rPPG_Methods aplicado à gravação inteira para GREEN, GBGR, OMIT e POS. O CHROM é causal e
+esquece o passado: cada amostra usa as estatísticas dos últimos `janela` frames (é igual à última
+amostra do CHROM em lote aplicado a essa janela, menos a média da janela).
+"""
+
+class MetodoIncremental(ABC):
+    """
+    Base dos métodos incrementais.
+
+    Parâmetros:
+    - dtype: Tipo dos BVPs devolvidos (None = rppg.DTYPE).
+    """
+    atraso = 0  # Número de frames recebidos cujas amostras ainda não foram emitidas
+
+    def __init__(self, dtype=None):
+        self.dtype = np.dtype(rppg.DTYPE if dtype is None else dtype)
+        self.n_frames = 0
+        self.num_patches = 0  # Definido pelo primeiro bloco recebido
+
+    def adiciona(self, frames):
+        """Processa um bloco de frames [num_patches, 3, n_frames] e devolve as novas amostras do BVP."""
+        frames = np.asarray(frames, dtype=self.dtype)
+        self.num_patches = frames.shape[0]
+        bvp = self._processa(frames)
+        self.n_frames += frames.shape[2]
+        return bvp.astype(self.dtype, copy=False)
+
+    def finaliza(self):
+        """Devolve as amostras pendentes no fim do fluxo ([num_patches, n_pendentes])."""
+        return np.zeros((self.num_patches, 0), dtype=self.dtype)
+
+    @abstractmethod
+    def _processa(self, frames):
+        """Calcula as amostras do BVP emitidas por um bloco [num_patches, 3, n_frames]."""
+
+class GREENIncremental(MetodoIncremental):
+    """GREEN: o BVP é o próprio canal verde."""
+    def _processa(self, frames):
+        return frames[:, 1, :]
+
+class GBGRIncremental(MetodoIncremental):
+    """GBGR: G/R + G/B, amostra por amostra."""
+    def _processa(self, frames):
+        return (frames[:, 1, :] / frames[:, 0, :]) + (frames[:, 1, :] / frames[:, 2, :])
+
+class OMITIncremental(MetodoIncremental):
+    """
+    OMIT: a projeção (I - S Sᵀ) depende só do primeiro frame (primeira coluna do QR), então é
+    calculada no primeiro bloco e aplicada aos seguintes.
+    """
+    def __init__(self, dtype=None):
+        super().__init__(dtype)
+        self.pesos = None  # Linha verde de I - S Sᵀ ([num_patches, 3])
+
+    def _processa(self, frames):
+        if self.pesos is None:
+            self.pesos = rppg.omit_weights(rppg.RGBStatistics(frames[:, :, :1])).astype(self.dtype)
+        return np.einsum('ec,ecf->ef', self.pesos, frames)
+
+class CHROMIncremental(MetodoIncremental):
+    """
+    CHROM com estatísticas em janela deslizante: cada amostra usa a média e os desvios padrão de
+    Xcomp e Ycomp nos últimos `janela` frames (ou em todos, enquanto houver menos frames), então é
+    igual à última amostra do CHROM em lote aplicado a essa janela, menos a média da janela. As
+    amostras anteriores de uma janela usam os alphas das janelas que terminam nelas, de modo que
+    a janela inteira não coincide com o CHROM em lote (ver EQUIVALENTES_AO_LOTE).
+
+    As somas da janela são atualizadas a cada frame (entra o frame novo, sai o de `janela` frames
+    atrás), com os valores deslocados pelo primeiro (Xcomp, Ycomp) para não perder precisão.
+
+    Parâmetros:
+    - janela: Número de frames usados nas estatísticas.
+    - dtype: Tipo dos BVPs devolvidos (None = rppg.DTYPE).
+    """
+    def __init__(self, janela, dtype=None):
+        super().__init__(dtype)
+        if janela is None or janela < 1:
+            raise ValueError("CHROM incremental precisa de `janela` >= 1 (em frames)")
+        self.janela = int(janela)
+        self.referencia = None  # Primeiro valor de (Xcomp, Ycomp), usado como deslocamento
+        self.historico = None   # Buffer circular com os últimos `janela` valores deslocados ([e, 2, janela])
+        self.soma = 0.0
+        self.soma_quadrados = 0.0
+
+    def _processa(self, frames):
+        X = frames.astype(np.float64)
+        comp = np.stack([3*X[:, 0] - 2*X[:, 1], (1.5*X[:, 0]) + X[:, 1] - (1.5*X[:, 2])], axis=1)  # [e, 2, k]
+        if self.referencia is None:
+            self.referencia = comp[:, :, :1].copy()
+            self.historico = np.zeros(comp.shape[:2] + (self.janela,))
+        d = comp - self.referencia
+        k = d.shape[2]
+
+        # Valor que sai da janela quando cada amostra nova entra (zero enquanto a janela cresce):
+        # as primeiras saem do buffer e, em blocos maiores que a janela, as demais do próprio bloco
+        sai = np.zeros_like(d)
+        m = min(k, self.janela)
+        posicoes = (self.n_frames + np.arange(m)) % self.janela
+        cheias = self.n_frames + np.arange(m) >= self.janela
+        sai[:, :, :m] = np.where(cheias, self.historico[:, :, posicoes], 0.0)
+        sai[:, :, m:] = d[:, :, :k - m]
+        self.historico[:, :, (self.n_frames + np.arange(k - m, k)) % self.janela] = d[:, :, k - m:]
+
+        soma = self.soma + np.cumsum(d - sai, axis=2)
+        soma_quadrados = self.soma_quadrados + np.cumsum(d * d - sai * sai, axis=2)
+        self.soma, self.soma_quadrados = soma[:, :, -1:], soma_quadrados[:, :, -1:]
+
+        n = np.minimum(self.n_frames + np.arange(1, k + 1), self.janela)
+        media = soma / n
+        var = np.maximum(soma_quadrados / n - media**2, 0)
+        # Sem variância de Ycomp (ex.: só um frame recebido) o alpha fica 0 em vez de NaN
+        alpha = np.sqrt(np.divide(var[:, 0], var[:, 1], out=np.zeros(var[:, 1].shape), where=var[:, 1] > 0))
+        # Centrado na média da janela: o alpha varia de amostra para amostra e, aplicado ao nível DC
+        # de Ycomp, criaria um sinal muito maior que o pulso
+        d = d - media
+        return d[:, 0] - alpha * d[:, 1]
+
+class POSIncremental(MetodoIncremental):
+    """
+    POS com janela deslizante de w = int(1.6 * fps) frames e overlap-add.
+
+    Guarda os últimos w - 1 frames e a soma parcial das amostras ainda cobertas por janelas
+    futuras. Uma amostra só é emitida quando nenhuma janela nova pode alterá-la, então a saída
+    tem um atraso de w - 1 frames.
+
+    Parâmetros:
+    - fps: Taxa de quadros (Hz).
+    - dtype: Tipo dos BVPs devolvidos (None = rppg.DTYPE).
+    - janelas_por_bloco: Máximo de janelas processadas de uma vez (limita a memória em blocos grandes).
+    """
+    eps = 10**-9
+
+    def __init__(self, fps, dtype=None, janelas_por_bloco=256):
+        super().__init__(dtype)
+        self.w = int(1.6 * fps)
+        self.janelas_por_bloco = janelas_por_bloco
+        self.buffer = None      # Últimos w - 1 frames recebidos ([e, 3, <= w-1])
+        self.pendente = None    # Overlap-add das amostras ainda não emitidas ([e, n_pendentes])
+        self.n_emitidas = 0
+
+    @property
+    def atraso(self):
+        return self.n_frames - self.n_emitidas
+
+    def _janelas(self, janelas):
+        """Pulso de cada janela [e, 3, n_janelas, w] (passos 5 a 7 do POS), com a média removida."""
+        Cn = janelas / (np.mean(janelas, axis=3, keepdims=True) + self.eps)
+        S1 = Cn[:, 1] - Cn[:, 2]
+        S2 = -2*Cn[:, 0] + Cn[:, 1] + Cn[:, 2]
+        alpha = np.std(S1, axis=2, keepdims=True) / (self.eps + np.std(S2, axis=2, keepdims=True))
+        Hn = S1 + alpha * S2
+        return Hn - np.mean(Hn, axis=2, keepdims=True)
+
+    def _processa(self, frames):
+        e, _, k = frames.shape
+        segmento = frames if self.buffer is None else np.concatenate([self.buffer, frames], axis=2)
+        inicio_segmento = self.n_frames - (0 if self.buffer is None else self.buffer.shape[2])
+        fim = self.n_frames + k
+
+        pendente = np.zeros((e, fim - self.n_emitidas))
+        if self.pendente is not None:
+            pendente[:, :self.pendente.shape[1]] = self.pendente
+
+        # Janelas [n-w+1, n] com n = w, ..., fim-1 que terminam neste bloco (como no POS em lote)
+        primeira = max(self.w, self.n_frames)
+        if primeira < fim:
+            janelas = np.lib.stride_tricks.sliding_window_view(segmento, self.w, axis=2)
+            janelas = janelas[:, :, primeira - self.w + 1 - inicio_segmento:]
+            for j0 in range(0, janelas.shape[2], self.janelas_por_bloco):
+                Hn = self._janelas(janelas[:, :, j0:j0 + self.janelas_por_bloco].astype(np.float64))
+                # Overlap-add (8): a janela j começa na amostra `deslocamento + j` do pendente
+                deslocamento = primeira + j0 - self.w + 1 - self.n_emitidas
+                n_janelas = Hn.shape[1]
+                for i in range(self.w):
+                    pendente[:, deslocamento + i:deslocamento + i + n_janelas] += Hn[:, :, i]
+
+        # Amostras anteriores ao início da próxima janela já são definitivas
+        n_finais = max(0, fim - self.w + 1 - self.n_emitidas)
+        self.pendente = pendente[:, n_finais:]
+        self.n_emitidas += n_finais
+        self.buffer = segmento[:, :, max(0, segmento.shape[2] - (self.w - 1)):].copy()
+        return pendente[:, :n_finais]
+
+    def finaliza(self):
+        if self.pendente is None:
+            return super().finaliza()
+        bvp = self.pendente
+        self.n_emitidas += bvp.shape[1]
+        self.pendente = np.zeros((bvp.shape[0], 0))
+        return bvp.astype(self.dtype, copy=False)
+
+# Métodos cuja saída incremental concatenada é igual à do método em lote sobre a gravação inteira
+EQUIVALENTES_AO_LOTE = ('GREEN', 'GBGR', 'OMIT', 'POS')
+
+METODOS_INCREMENTAIS = {
+    'CHROM': lambda fps, dtype, janela: CHROMIncremental(janela, dtype),
+    'GREEN': lambda fps, dtype, janela: GREENIncremental(dtype),
+    'GBGR': lambda fps, dtype, janela: GBGRIncremental(dtype),
+    'OMIT': lambda fps, dtype, janela: OMITIncremental(dtype),
+    'POS': lambda fps, dtype, janela: POSIncremental(fps, dtype),
+}
+
+def cria_metodo(nome, fps=None, dtype=None, janela=None):
+    """
+    Cria o método incremental `nome` (chave de METODOS_INCREMENTAIS).
+
+    `janela` é o número de frames das estatísticas dos métodos que as usam (obrigatória para o CHROM).
+    """
+    if nome not in METODOS_INCREMENTAIS:
+        raise ValueError(f"Método sem versão incremental: {nome}")
+    return METODOS_INCREMENTAIS[nome](fps, dtype, janela)
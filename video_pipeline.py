@@ -0,0 +1,188 @@
+import numpy as np
+import threading
+import queue
+import cv2
+
+"""
+Pipeline em estágios para a extração de sinais de um vídeo.
+
+Decodificação, inferência dos landmarks e redução das ROIs rodam em threads separadas,
+ligadas por filas limitadas; o acúmulo dos resultados fica com quem consome o gerador
+(normalmente a thread principal). Cada estágio tem um único worker e as filas são FIFO,
+então a ordem dos frames é preservada. Como as filas têm tamanho máximo, um estágio lento
+bloqueia os anteriores (backpressure) e a memória usada fica limitada.
+"""
+
+_FIM = object()  # Marca o fim do fluxo de frames
+_INTERVALO_ESPERA = 0.1  # Intervalo (s) para checar se o pipeline foi interrompido
+
+class _ErroEstagio:
+    """Encapsula uma exceção levantada em um estágio para repassá-la ao consumidor."""
+    def __init__(self, erro):
+        self.erro = erro
+
+def _coloca(fila, item, parar):
+    """Coloca um item na fila, desistindo se o pipeline for interrompido. Retorna False nesse caso."""
+    while not parar.is_set():
+        try:
+            fila.put(item, timeout=_INTERVALO_ESPERA)
+            return True
+        except queue.Full:
+            pass
+    return False
+
+def _retira(fila, parar):
+    """Retira um item da fila; retorna _FIM se o pipeline for interrompido."""
+    while not parar.is_set():
+        try:
+            return fila.get(timeout=_INTERVALO_ESPERA)
+        except queue.Empty:
+            pass
+    return _FIM
+
+def _estagio_decodificacao(captura, saida, parar):
+    """Lê os frames do vídeo e os envia, numerados, para o próximo estágio."""
+    try:
+        n_frame = 0
+        while not parar.is_set():
+            ret, frame = captura.read()
+            if not ret:
+                break
+            if not _coloca(saida, (n_frame, frame), parar):
+                return
+            n_frame += 1
+    except Exception as erro:
+        _coloca(saida, _ErroEstagio(erro), parar)
+        return
+    _coloca(saida, _FIM, parar)
+
+def _estagio(funcao, entrada, saida, parar):
+    """Aplica `funcao(item)` a cada item da fila de entrada e envia o resultado para a fila de saída."""
+    while True:
+        item = _retira(entrada, parar)
+        if item is _FIM or isinstance(item, _ErroEstagio):
+            _coloca(saida, item, parar)
+            return
+        try:
+            resultado = funcao(item)
+        except Exception as erro:
+            _coloca(saida, _ErroEstagio(erro), parar)
+            return
+        if not _coloca(saida, resultado, parar):
+            return
+
+def executa_pipeline(captura, detecta, extrai, tamanho_fila=16):
+    """
+    Processa os frames de `captura` em estágios paralelos e gera os resultados na ordem dos frames.
+
+    Parâmetros:
+    - captura: Objeto cv2.VideoCapture já aberto.
+    - detecta: Função `detecta(frame) -> landmarks` (estágio de inferência dos landmarks).
+    - extrai: Função `extrai(frame, landmarks) -> resultado` (estágio de redução das ROIs).
+    - tamanho_fila: Número máximo de itens em cada fila entre os estágios.
+
+    Gera tuplas (n_frame, frame, resultado). Exceções de qualquer estágio são relançadas no
+    consumidor; interromper a iteração (break) encerra todas as threads.
+    """
+    parar = threading.Event()
+    fila_frames = queue.Queue(maxsize=tamanho_fila)
+    fila_landmarks = queue.Queue(maxsize=tamanho_fila)
+    fila_rois = queue.Queue(maxsize=tamanho_fila)
+
+    threads = [
+        threading.Thread(target=_estagio_decodificacao, args=(captura, fila_frames, parar), daemon=True),
+        threading.Thread(target=_estagio,
+                         args=(lambda item: (item[0], item[1], detecta(item[1])), fila_frames, fila_landmarks, parar),
+                         daemon=True),
+        threading.Thread(target=_estagio,
+                         args=(lambda item: (item[0], item[1], extrai(item[1], item[2])), fila_landmarks, fila_rois, parar),
+                         daemon=True),
+    ]
+    for thread in threads:
+        thread.start()
+
+    try:
+        while True:
+            item = _retira(fila_rois, parar)
+            if item is _FIM:
+                break
+            if isinstance(item, _ErroEstagio):
+                raise item.erro
+            yield item
+    finally:
+        parar.set()
+        for thread in threads:
+            thread.join()
+
+def estima_num_frames(captura, maximo=10**6):
+    """Número de frames informado pelo container (0 se indisponível ou implausível, como em .h264 cru)."""
+    n_frames = captura.get(cv2.CAP_PROP_FRAME_COUNT)
+    return int(n_frames) if 0 < n_frames <= maximo else 0
+
+class AcumuladorFrames:
+    """
+    Acumula os resultados por frame diretamente em um array float32 pré-alocado.
+
+    O array já tem o formato usado pelos métodos rPPG: com `frames_no_fim=True` os frames ficam
+    no último eixo ([num_patches, 3, num_frames]); caso contrário no primeiro
+    ([num_frames, rows, columns, 3], formato do SSR). Quando a capacidade acaba, o array cresce
+    em blocos, evitando uma alocação por frame e a cópia final de np.array(lista).transpose(...).
+
+    Parâmetros:
+    - forma_frame: Formato do resultado de um frame (ex.: (num_patches, 3)).
+    - capacidade: Número de frames esperado (0 se desconhecido).
+    - frames_no_fim: Se True, os frames ocupam o último eixo; senão, o primeiro.
+    - dtype: Tipo do array.
+    - tamanho_bloco: Crescimento mínimo, em frames, quando a capacidade acaba.
+    """
+    def __init__(self, forma_frame, capacidade=0, frames_no_fim=True, dtype=np.float32, tamanho_bloco=1024):
+        self.forma_frame = tuple(forma_frame)
+        self.frames_no_fim = frames_no_fim
+        self.dtype = dtype
+        self.tamanho_bloco = tamanho_bloco
+        self.n_frames = 0
+        self.dados = self._aloca(capacidade if capacidade > 0 else tamanho_bloco)
+
+    def _aloca(self, capacidade):
+        if self.frames_no_fim:
+            return np.empty(self.forma_frame + (capacidade,), dtype=self.dtype)
+        return np.empty((capacidade,) + self.forma_frame, dtype=self.dtype)
+
+    @property
+    def capacidade(self):
+        return self.dados.shape[-1] if self.frames_no_fim else self.dados.shape[0]
+
+    def _cresce(self):
+        # Crescimento geométrico (50%) com mínimo de um bloco: custo amortizado O(1) por frame
+        novos = self._aloca(self.capacidade + max(self.tamanho_bloco, self.capacidade // 2))
+        if self.frames_no_fim:
+            novos[..., :self.n_frames] = self.dados[..., :self.n_frames]
+        else:
+            novos[:self.n_frames] = self.dados[:self.n_frames]
+        self.dados = novos
+
+    def adiciona(self, valores):
+        """Escreve o resultado de um frame na próxima posição."""
+        if self.n_frames == self.capacidade:
+            self._cresce()
+
+        if self.frames_no_fim:
+            self.dados[..., self.n_frames] = valores
+        else:
+            self.dados[self.n_frames] = valores
+        self.n_frames += 1
+
+    def array(self):
+        """
+        Retorna os frames acumulados como um array contíguo.
+
+        Com os frames no primeiro eixo, a fatia [:n_frames] já é contígua (view, sem cópia). Com os
+        frames no último eixo e capacidade sobrando (ex.: vídeos .h264, sem contagem de frames), a
+        fatia teria linhas com passo da capacidade e todos os métodos rPPG leriam uma view não
+        contígua; nesse caso o array é recortado uma única vez (uma cópia) e passa a ser o próprio buffer.
+        """
+        if not self.frames_no_fim:
+            return self.dados[:self.n_frames]
+        if self.capacidade != self.n_frames:
+            self.dados = np.ascontiguousarray(self.dados[..., :self.n_frames])
+        return self.dados